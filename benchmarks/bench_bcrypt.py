@@ -0,0 +1,58 @@
+# Logins per second at different bcrypt costs through utils/hashing's pool.
+# Run from the root folder: python -m benchmarks.bench_bcrypt [logins] [rounds ...]
+
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from utils.hashing import (
+    HASH_WORKERS,
+    HASH_POOL,
+    calibrate_rounds,
+    hash_password,
+    verify_password,
+    shutdown_hashing_pool,
+)
+from utils.helpers import green, blue, reset
+
+# Concurrent callers, like request threads in the web server
+CALLERS = 16
+
+
+def timed_verify(password, hashed):
+    start = time.perf_counter()
+    assert verify_password(password, hashed)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    costs = [int(arg) for arg in sys.argv[2:]] or [10, 11, 12, 13]
+    print(blue + f"Pool: {HASH_POOL}, {HASH_WORKERS} worker(s)" + reset)
+    print(blue + f"Calibrated cost on this machine: {calibrate_rounds()}" + reset)
+
+    for rounds in costs:
+        hashed = hash_password("correct horse", rounds)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CALLERS) as callers:
+            timings = list(
+                callers.map(
+                    lambda _: timed_verify("correct horse", hashed), range(logins)
+                )
+            )
+        elapsed = time.perf_counter() - start
+        print(
+            blue
+            + f"cost {rounds:>2}: {logins / elapsed:8.1f} logins/s | "
+            + f"p50 {statistics.median(timings):8.1f} ms | "
+            + f"max {max(timings):8.1f} ms"
+            + reset
+        )
+
+    shutdown_hashing_pool()
+    print(green + f"Done ({logins} logins per cost, {CALLERS} callers)." + reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Encode/decode time, payload size and Redis memory per cache codec.
+# Run from the root folder: python -m benchmarks.bench_cache_codec [documents]
+
+import sys
+import time
+import json
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId, Decimal128
+from connection.connect_redis import get_cache_redis_client
+from db.cache_codec import encode, decode, available_codecs, available_compressions
+from utils.helpers import green, blue, reset
+
+ROUNDS = 20
+
+
+def sample_documents(count):
+    start = datetime(2022, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "company_name": f"Company {i}",
+            "filing_date": start + timedelta(days=i),
+            "price": Decimal128(f"{random.uniform(1, 500):.4f}"),
+            "top_holdings": [
+                {"stock": f"TICK{j}", "amount": random.randint(1, 10**6)}
+                for j in range(30)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = func(*args)
+    return (time.perf_counter() - start) * 1000 / ROUNDS, result
+
+
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    documents = sample_documents(count)
+    client = get_cache_redis_client()
+    key = "bench:cache_codec"
+
+    # The old path: JSON only works once ObjectId/datetime/Decimal128 are strings
+    as_json = json.loads(json.dumps(documents, default=str))
+    encode_ms, blob = timed(lambda v: json.dumps(v).encode(), as_json)
+    decode_ms, _ = timed(json.loads, blob)
+    client.set(key, blob)
+    print(
+        blue
+        + f"{'json (legacy)':<18} encode {encode_ms:8.2f} ms | decode {decode_ms:8.2f} ms"
+        + f" | {len(blob):>9} B | redis {client.memory_usage(key):>9} B"
+        + reset
+    )
+
+    for codec in available_codecs():
+        if codec == "json":
+            continue
+        for compression in available_compressions():
+            encode_ms, blob = timed(encode, documents, codec, compression)
+            decode_ms, decoded = timed(decode, blob)
+            assert decoded[0]["_id"] == documents[0]["_id"]
+            client.set(key, blob)
+            label = f"{codec}+{compression}"
+            print(
+                blue
+                + f"{label:<18} encode {encode_ms:8.2f} ms | decode {decode_ms:8.2f} ms"
+                + f" | {len(blob):>9} B | redis {client.memory_usage(key):>9} B"
+                + reset
+            )
+
+    client.delete(key)
+    print(green + f"Done ({count} documents, {ROUNDS} rounds each)." + reset)
+
+
+if __name__ == "__main__":
+    main()
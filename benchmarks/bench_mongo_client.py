@@ -0,0 +1,68 @@
+# Per-call latency: new MongoClient per query (old get_db) vs the pooled client.
+# Run from the root folder: python -m benchmarks.bench_mongo_client [iterations]
+
+import sys
+import time
+import statistics
+from pymongo import MongoClient
+from connection.connect_db import (
+    MONGO_URI,
+    MONGO_DBNAME,
+    MONGO_COLLECTIONS,
+    get_collection,
+    close_client,
+)
+from utils.helpers import green, blue, reset
+
+
+def fresh_client_query(collection_name):
+    # What every insert/find/update/delete used to do.
+    client = MongoClient(MONGO_URI)
+    try:
+        client[MONGO_DBNAME][collection_name].find_one({})
+    finally:
+        client.close()
+
+
+def pooled_query(collection_key):
+    get_collection(collection_key).find_one({})
+
+
+def measure(func, arg, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func(arg)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        blue
+        + f"{label:<16} mean {statistics.mean(timings):8.2f} ms | "
+        + f"median {statistics.median(timings):8.2f} ms | p95 {p95:8.2f} ms"
+        + reset
+    )
+
+
+def main():
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    collection_key = "admin"
+    collection_name = MONGO_COLLECTIONS[collection_key]
+
+    # Warm the pool once so we measure steady state, not the first handshake.
+    pooled_query(collection_key)
+
+    report("client per call", measure(fresh_client_query, collection_name, iterations))
+    report("pooled client", measure(pooled_query, collection_key, iterations))
+
+    close_client()
+    print(green + f"Done ({iterations} iterations each)." + reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Session verify throughput: the old GET + EXPIRE round trips vs the one-trip
+# Lua verify in utils/session.py, sequential and from a thread pool.
+# Run from the root folder: python -m benchmarks.bench_session [sessions] [threads]
+
+import sys
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from connection.connect_redis import get_redis_client
+from utils.session import create_session, verify_session, revoke_user_sessions
+from utils.helpers import green, blue, reset
+
+BENCH_USERS = 50
+
+
+def two_round_trips(token):
+    # What verify_session used to cost: a read, then a separate expire
+    client = get_redis_client("session")
+    if client.hget(f"session:{token}", "uid"):
+        client.expire(f"session:{token}", 900)
+
+
+def measure(func, tokens):
+    timings = []
+    for token in tokens:
+        start = time.perf_counter()
+        func(token)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    rate = len(timings) / (sum(timings) / 1000)
+    print(
+        blue
+        + f"{label:<22} p50 {statistics.median(timings):.3f} ms | p99 {p99:.3f} ms"
+        + f" | {rate:,.0f} verifies/s"
+        + reset
+    )
+
+
+def threaded(tokens, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(verify_session, tokens))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    print(
+        blue
+        + f"{'lua verify x' + str(threads) + ' threads':<22} "
+        + f"{len(tokens) / elapsed:,.0f} verifies/s"
+        + reset
+    )
+
+
+def main():
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    users = [f"bench-user-{i}" for i in range(BENCH_USERS)]
+    tokens = [create_session(users[i % BENCH_USERS]) for i in range(count)]
+
+    verify_session(tokens[0])  # Loads the script
+    report("get + expire", measure(two_round_trips, tokens))
+    report("lua verify", measure(verify_session, tokens))
+    threaded(tokens, threads)
+
+    revoked = sum(revoke_user_sessions(user) for user in users)
+    print(green + f"Done ({count} sessions, {revoked} revoked)." + reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Import-time budget per entry point, based on `python -X importtime`.
+# Run from the root folder: python -m benchmarks.import_budget
+# Exits 1 when an entry point goes over budget, so it can gate CI.
+
+import os
+import re
+import sys
+import subprocess
+from utils.helpers import green, red, blue, reset
+
+# Cumulative import time budget in milliseconds per entry module
+IMPORT_BUDGETS_MS = {
+    "main": int(os.getenv("IMPORT_BUDGET_MAIN_MS", 400)),
+    "backend": int(os.getenv("IMPORT_BUDGET_BACKEND_MS", 700)),
+    "seeder": int(os.getenv("IMPORT_BUDGET_SEEDER_MS", 400)),
+    "tasks": int(os.getenv("IMPORT_BUDGET_TASKS_MS", 800)),
+    "celery_config": int(os.getenv("IMPORT_BUDGET_CELERY_CONFIG_MS", 800)),
+}
+
+RUNS = 3
+
+# Point every connection at a blackhole address (TEST-NET-1): if anything
+# connects at import time it stalls on the timeout and blows the budget.
+BLACKHOLE_ENV = {
+    "REDIS_HOST": "192.0.2.1",
+    "REDIS_PORT": "6379",
+    "REDIS_BROKER_DB": "0",
+    "REDIS_BACKEND_DB": "1",
+    "MONGO_URI": "mongodb://192.0.2.1:27017/?connectTimeoutMS=5000",
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def import_time_ms(module):
+    env = dict(os.environ, **BLACKHOLE_ENV)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        timeout=120,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match and match.group(3) == module:
+            return int(match.group(2)) / 1000  # cumulative, microseconds
+    raise RuntimeError(f"No importtime entry for {module}")
+
+
+def main():
+
+    over_budget = []
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        try:
+            # Best of a few runs, the first one also pays for .pyc compilation
+            took = min(import_time_ms(module) for _ in range(RUNS))
+        except Exception as e:
+            print(red + f"{module:<14} failed to import: {e}" + reset)
+            over_budget.append(module)
+            continue
+        colour = green if took <= budget else red
+        print(colour + f"{module:<14} {took:8.1f} ms (budget {budget} ms)" + reset)
+        if took > budget:
+            over_budget.append(module)
+
+    if over_budget:
+        print(red + f"Over budget: {', '.join(over_budget)}" + reset)
+        sys.exit(1)
+    print(blue + "All entry points within their import budget." + reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,73 @@
 import os
 import logging
 from celery import Celery
+from celery.signals import after_setup_logger, after_setup_task_logger
 from dotenv import load_dotenv
 from logging.handlers import RotatingFileHandler
+from connection.connect_redis import redis_role_settings, redis_url
 
 load_dotenv()
 
 
 def make_celery(app_name=__name__):
-    broker_url = f"redis://{os.getenv('REDIS_HOST')}:{int(os.getenv('REDIS_PORT'))}/{int(os.getenv('REDIS_BROKER_DB'))}"
-    backend_url = f"redis://{os.getenv('REDIS_HOST')}:{int(os.getenv('REDIS_PORT'))}/{int(os.getenv('REDIS_BACKEND_DB'))}"
+    broker_url = redis_url("broker")
+    backend_url = redis_url("backend")
 
-    return Celery(app_name, broker=broker_url, backend=backend_url, include=["tasks"])
+    # Celery connects to the broker on first use, not here
+    app = Celery(app_name, broker=broker_url, backend=backend_url, include=["tasks"])
 
+    # Broker and result backend get their own pool sizes and timeouts
+    broker = redis_role_settings("broker")
+    backend = redis_role_settings("backend")
+    app.conf.update(
+        broker_pool_limit=broker["max_connections"],
+        broker_transport_options={
+            "max_connections": broker["max_connections"],
+            "socket_timeout": broker["socket_timeout"],
+            "socket_connect_timeout": broker["socket_connect_timeout"],
+            "health_check_interval": broker["health_check_interval"],
+        },
+        redis_max_connections=backend["max_connections"],
+        redis_socket_timeout=backend["socket_timeout"],
+        redis_socket_connect_timeout=backend["socket_connect_timeout"],
+        redis_backend_health_check_interval=backend["health_check_interval"],
+    )
+    return app
 
-celery = make_celery()
 
+celery = make_celery()
 
 LOG_FOLDER = os.path.join(os.path.dirname(__file__), "log")
-os.makedirs(LOG_FOLDER, exist_ok=True)  # Ensure the log folder exists
-
-log_file = os.path.join(LOG_FOLDER, "celery_task.log")
-handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=5)
-handler.setLevel(logging.INFO)
-
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
 
 logger = logging.getLogger("celery")
 logger.setLevel(logging.INFO)
-logger.addHandler(handler)
+
+
+@after_setup_logger.connect
+@after_setup_task_logger.connect
+def setup_file_logging(**kwargs):
+    # Only worker/beat processes write the log file, importing this module
+    # (Flask, CLI) no longer touches the filesystem.
+    if any(isinstance(h, RotatingFileHandler) for h in logger.handlers):
+        return
+    os.makedirs(LOG_FOLDER, exist_ok=True)  # Ensure the log folder exists
+
+    log_file = os.path.join(LOG_FOLDER, "celery_task.log")
+    handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=5)
+    handler.setLevel(logging.INFO)
+
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
 
 celery.conf.update(
     task_track_started=True, result_expires=3600, task_ignore_result=False
 )
+
+# Mail has its own queue so a slow SMTP server never delays cache/maintenance
+# work: celery -A tasks worker -Q celery,mail (or a separate -Q mail worker)
+celery.conf.task_routes = {
+    "tasks.send_mail": {"queue": "mail"},
+    "tasks.send_2fa_code": {"queue": "mail"},
+}
@@ -20,7 +20,11 @@ celery.conf.beat_schedule.update(
         "clean-celery-metadata-every-day": {
             "task": "tasks.clean_celery_metadata",
             "schedule": crontab(hour=3, minute=0),
-        }
+        },
+        "apply-retention-every-day": {
+            "task": "tasks.apply_retention",
+            "schedule": crontab(hour=2, minute=30),
+        },
     }
 )
 
@@ -1,6 +1,7 @@
 # Setting up the connection
 import os
 import logging
+import threading
 from pymongo import MongoClient
 from dotenv import load_dotenv
 from utils.helpers import reset, green, red
@@ -21,19 +22,84 @@ MONGO_COLLECTIONS = {
     "starting_profit": os.getenv("MONGO_PROF"),
 }
 
+# Pool settings (can be tuned per deployment through .env)
+MONGO_POOL_SETTINGS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", 300000)),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_MS", 5000)),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+}
+
 # Setup logger
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+# One client per process, created on first use.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _forget_client():
+    # After fork the child must not touch the parent's sockets, drop the reference
+    # so the next call builds a fresh pool in this process.
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client)
+
+
+def get_client():
+
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            try:
+                # connect=False: no I/O until the first operation (safe before fork)
+                from utils.metrics import mongo_listeners
+
+                _client = MongoClient(
+                    MONGO_URI,
+                    connect=False,
+                    event_listeners=mongo_listeners(),
+                    **MONGO_POOL_SETTINGS,
+                )
+                _client_pid = pid
+                logger.info(green + f"MongoClient created for pid {pid}" + reset)
+            except Exception as e:
+                logger.error(red + f"Failed to create MongoClient: {e}" + reset)
+                raise e
+    return _client
+
+
+def close_client():
+
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+            logger.info(green + "MongoClient closed." + reset)
+        _client = None
+        _client_pid = None
+
 
 def get_db():
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DBNAME]
-        logger.info(green + f"Connected to database: {db.name}" + reset)
+        db = get_client()[MONGO_DBNAME]
         return db
     except Exception as e:
         logger.error(red + f"Failed to connect to MongoDB: {e}" + reset)
@@ -1,39 +1,134 @@
 # Connect redis
-import redis
 import os
 import logging
+import threading
+import redis
 from dotenv import load_dotenv
 from utils.helpers import reset, green, red
 
 load_dotenv()
 
-# Redis connection settings
-REDIS_HOST = os.getenv("REDIS_HOST")
-REDIS_PORT = int(os.getenv("REDIS_PORT"))
-REDIS_DB = int(os.getenv("REDIS_BROKER_DB"))
-
 # Setup logger
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-# Setup Redis connection
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST"),
-    port=os.getenv("REDIS_PORT"),
-    db=0,
-    decode_responses=True,
-)
+# One pool per role so a flood in one (cache) cannot starve another (sessions).
+# Every value can be overridden with REDIS_<ROLE>_<SETTING>, e.g. REDIS_CACHE_DB.
+REDIS_ROLES = {
+    "default": {"db": 0, "max_connections": 20, "socket_timeout": 2.0},
+    "cache": {"db": 0, "max_connections": 50, "socket_timeout": 1.0, "binary": True},
+    "session": {"db": 0, "max_connections": 20, "socket_timeout": 0.5},
+    "rate_limit": {"db": 0, "max_connections": 20, "socket_timeout": 0.5},
+    "broker": {
+        "db_env": "REDIS_BROKER_DB",
+        "max_connections": 10,
+        "socket_timeout": 5.0,
+    },
+    "backend": {
+        "db_env": "REDIS_BACKEND_DB",
+        "max_connections": 10,
+        "socket_timeout": 5.0,
+    },
+}
+
+# Clients are built on first use, importing this module does no network I/O.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _env(role, setting, default, cast):
+    value = os.getenv(f"REDIS_{role.upper()}_{setting}")
+    return default if value in (None, "") else cast(value)
+
+
+def redis_role_settings(role="default"):
+
+    if role not in REDIS_ROLES:
+        raise ValueError(f"Unknown Redis role: {role}")
+    defaults = REDIS_ROLES[role]
+    db = defaults.get("db", 0)
+    if "db_env" in defaults:
+        db = int(os.getenv(defaults["db_env"], 0))
+    return {
+        "host": os.getenv("REDIS_HOST"),
+        "port": int(os.getenv("REDIS_PORT", 6379)),
+        "db": _env(role, "DB", db, int),
+        "max_connections": _env(
+            role, "MAX_CONNECTIONS", defaults["max_connections"], int
+        ),
+        "socket_timeout": _env(
+            role, "SOCKET_TIMEOUT", defaults["socket_timeout"], float
+        ),
+        "socket_connect_timeout": _env(role, "CONNECT_TIMEOUT", 2.0, float),
+        "health_check_interval": _env(role, "HEALTH_CHECK_INTERVAL", 30, int),
+        "decode_responses": not defaults.get("binary", False),
+        # RESP3 client-side caching (Redis >= 6, redis-py >= 5.1)
+        "client_cache": _env(role, "CLIENT_CACHE", "false", str).lower() == "true",
+        "client_cache_size": _env(role, "CLIENT_CACHE_SIZE", 10000, int),
+    }
+
+
+def redis_url(role):
+    settings = redis_role_settings(role)
+    return f"redis://{settings['host']}:{settings['port']}/{settings['db']}"
+
+
+def _build_client(role):
+
+    settings = redis_role_settings(role)
+    client_cache = settings.pop("client_cache")
+    cache_size = settings.pop("client_cache_size")
+    if client_cache:
+        from redis.cache import CacheConfig
+
+        settings.update(protocol=3, cache_config=CacheConfig(max_size=cache_size))
+    from utils.metrics import instrument_redis
+
+    return instrument_redis(redis.Redis(retry_on_timeout=True, **settings), role)
+
+
+def get_redis_client(role="default"):
+
+    client = _clients.get(role)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(role)
+        if client is None:
+            try:
+                client = _clients[role] = _build_client(role)
+                logger.info(green + f"Redis pool '{role}' created." + reset)
+            except (redis.RedisError, ImportError) as e:
+                logger.error(red + f"Failed to connect to Redis ({role}): {e}" + reset)
+                raise e
+    return client
+
+
+def get_cache_redis_client():
+    # Cache values are binary (see db/cache_codec.py)
+    return get_redis_client("cache")
+
+
+def ping_redis(roles=None):
 
+    healthy = True
+    for role in roles or REDIS_ROLES:
+        try:
+            get_redis_client(role).ping()
+            logger.info(green + f"Connected to Redis ({role})!" + reset)
+        except redis.ConnectionError as e:
+            logger.error(red + f"Failed to connect to Redis ({role}): {e}" + reset)
+            healthy = False
+    return healthy
 
-def get_redis_client():
 
-    try:
-        # Test connection
-        redis_client.ping()
-        logger.info(green + "Connected to Redis!" + reset)
-        return redis_client
-    except redis.ConnectionError as e:
-        logger.error(red + f"Failed to connect to Redis: {e}" + reset)
-        raise e
+def __getattr__(name):
+    # Old module-level names, resolved lazily
+    if name == "redis_client":
+        return get_redis_client()
+    if name == "cache_redis_client":
+        return get_cache_redis_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,24 @@
+import os
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
-from db.db_operations import find_documents, insert_document
-from utils.helpers import red, green, reset
+from bson import ObjectId
+from db.db_operations import (
+    insert_document,
+    iter_documents,
+    aggregate_documents,
+    bulk_insert_documents,
+)
+from db.redis_operations import (
+    get_collection_version,
+    get_stale_while_revalidate,
+    query_shape_digest,
+    register_refresher,
+    SWR_CACHE_PREFIX,
+)
+from utils.helpers import red, green, blue, reset
 
 #
 # ---- For the audit logs --->
@@ -12,6 +29,154 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Events are buffered and written with insert_many off the request path.
+# AUDIT_SYNC=true writes inline (tests, one-off scripts).
+AUDIT_SYNC = os.getenv("AUDIT_SYNC", "false").lower() == "true"
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 100))
+AUDIT_FLUSH_MS = int(os.getenv("AUDIT_FLUSH_MS", 500))
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", 10000))
+# Back-pressure when the queue is full: block (wait AUDIT_BLOCK_MS, then write
+# inline), sync (write inline right away) or drop (count and discard).
+AUDIT_OVERFLOW = os.getenv("AUDIT_OVERFLOW", "block")
+AUDIT_BLOCK_MS = int(os.getenv("AUDIT_BLOCK_MS", 50))
+
+
+class _AuditWriter:
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=AUDIT_QUEUE_MAX)
+        self.stats = {
+            "queued": 0,
+            "written": 0,
+            "inline": 0,
+            "dropped": 0,
+            "batches": 0,
+        }
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name="audit-writer", daemon=True
+        )
+        self.thread.start()
+
+    def _write(self, batch):
+        results = bulk_insert_documents("audit_log", batch, batch_size=len(batch))
+        written = sum(result["inserted"] for result in results)
+        self.stats["written"] += written
+        self.stats["batches"] += 1
+        if written != len(batch):
+            logger.error(
+                red + f"Audit flush wrote {written} of {len(batch)} event(s)" + reset
+            )
+
+    def _run(self):
+        timeout = AUDIT_FLUSH_MS / 1000
+        while True:
+            batch, waiters = [], []
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return
+                continue
+
+            # Collect up to a batch, or whatever arrives within the flush window
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)  # flush() marker
+                else:
+                    batch.append(item)
+                if len(batch) >= AUDIT_BATCH_SIZE or waiters:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.error(red + f"Failed to flush audit events: {e}" + reset)
+            for waiter in waiters:
+                waiter.set()
+
+    def submit(self, event):
+        try:
+            if AUDIT_OVERFLOW == "block":
+                self.queue.put(event, timeout=AUDIT_BLOCK_MS / 1000)
+            else:
+                self.queue.put_nowait(event)
+            self.stats["queued"] += 1
+            return
+        except queue.Full:
+            pass
+
+        if AUDIT_OVERFLOW == "drop":
+            self.stats["dropped"] += 1
+            logger.warning(blue + "Audit queue full, event dropped" + reset)
+            return
+        # Queue is full: fall back to writing this one on the caller's thread
+        self.stats["inline"] += 1
+        insert_document("audit_log", event)
+
+    def flush(self, timeout=5.0):
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        flushed = self.flush(timeout)
+        self.stopped.set()
+        self.thread.join(timeout)
+        return flushed
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+
+    global _writer
+    # A writer thread does not survive fork, children start their own
+    if _writer is None or _writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = _AuditWriter()
+    return _writer
+
+
+def flush_audit_log(timeout=5.0):
+
+    if _writer is None or _writer.pid != os.getpid():
+        return True
+    return _writer.flush(timeout)
+
+
+def shutdown_audit_writer(timeout=5.0):
+
+    global _writer
+    if _writer is None or _writer.pid != os.getpid():
+        return True
+    flushed = _writer.stop(timeout)
+    _writer = None
+    if not flushed:
+        logger.error(red + "Audit writer did not flush before shutdown" + reset)
+    return flushed
+
+
+def get_audit_writer_stats():
+    if _writer is None:
+        return {}
+    return dict(_writer.stats, pending=_writer.queue.qsize())
+
+
+atexit.register(shutdown_audit_writer)
+
 
 def log_audit_event(user_id, email, action, details=None):
 
@@ -23,7 +188,10 @@ def log_audit_event(user_id, email, action, details=None):
             "details": details or {},
             "timestamp": datetime.now(),
         }
-        insert_document("audit_log", audit_log)
+        if AUDIT_SYNC:
+            insert_document("audit_log", audit_log)
+        else:
+            _get_writer().submit(audit_log)
         logger.info(
             green + f"Audit log created for user {email}, action: {action}" + reset
         )
@@ -31,12 +199,130 @@ def log_audit_event(user_id, email, action, details=None):
         logger.error(red + f"Failed to log audit event: {e}" + reset)
 
 
-def get_audit_logs(user_id=None, action=None):
+AUDIT_QUERY_MAX_MS = int(os.getenv("AUDIT_QUERY_MAX_MS", 5000))
+AUDIT_PAGE_MAX = 500
+AUDIT_HOURLY_SOFT_TTL = int(os.getenv("AUDIT_HOURLY_SOFT_TTL", 60))
+AUDIT_HOURLY_HARD_TTL = int(os.getenv("AUDIT_HOURLY_HARD_TTL", 3600))
+
+
+def encode_audit_cursor(log):
+    return f"{log['timestamp'].isoformat()}|{log['_id']}"
+
+
+def decode_audit_cursor(cursor):
+    try:
+        timestamp, _, object_id = cursor.partition("|")
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except Exception:
+        raise ValueError(f"Invalid audit log cursor: {cursor}")
+
+
+def get_audit_logs(
+    user_id=None, action=None, since=None, until=None, limit=50, after=None
+):
+
+    # Newest first, keyset-paginated on (timestamp, _id): every page is an
+    # index range scan, no skip and no in-memory sort however large the log.
     query = {}
     if user_id:
         query["user_id"] = user_id
     if action:
         query["action"] = action
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if after:
+        timestamp, object_id = decode_audit_cursor(after)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": object_id}},
+        ]
+
+    limit = max(1, min(int(limit), AUDIT_PAGE_MAX))
+    try:
+        logs = list(
+            iter_documents(
+                "audit_log",
+                query,
+                sort_by=[("timestamp", -1), ("_id", -1)],
+                limit=limit + 1,
+                max_time_ms=AUDIT_QUERY_MAX_MS,
+            )
+        )
+    except Exception as e:
+        logger.error(red + f"Failed to query audit logs: {e}" + reset)
+        return {"logs": [], "next": None}
+
+    # One extra document tells us whether there is a next page
+    next_cursor = encode_audit_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return {"logs": logs[:limit], "next": next_cursor}
+
+
+def _count_per_hour(user_id, since, until):
+
+    # Refresher: since/until arrive as ISO strings (the args travel to Celery)
+    since = datetime.fromisoformat(since) if since else None
+    until = datetime.fromisoformat(until) if until else None
+    match = {}
+    if user_id:
+        match["user_id"] = user_id
+    if since or until:
+        match["timestamp"] = {}
+        if since:
+            match["timestamp"]["$gte"] = since
+        if until:
+            match["timestamp"]["$lt"] = until
+
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "action": "$action",
+                    "hour": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+                },
+                "count": {"$sum": 1},
+            }
+        },
+        {"$sort": {"_id.hour": 1, "_id.action": 1}},
+        {
+            "$project": {
+                "_id": 0,
+                "action": "$_id.action",
+                "hour": "$_id.hour",
+                "count": 1,
+            }
+        },
+    ]
+    return aggregate_documents("audit_log", pipeline, max_time_ms=AUDIT_QUERY_MAX_MS)
 
-    logs = find_documents["audit_log"].find(query).sort("timestamp", -1)
-    return sorted(logs, key=lambda x: x["timestamp"], reverse=True)
+
+register_refresher("audit_hourly", _count_per_hour)
+
+
+def count_audit_actions_per_hour(user_id=None, since=None, until=None):
+
+    # Dashboard aggregate over the whole log: served stale-while-revalidate, a
+    # new audit write marks it stale and a Celery task recomputes it while
+    # callers keep getting the previous counts.
+    args = [
+        user_id,
+        since.isoformat() if since else None,
+        until.isoformat() if until else None,
+    ]
+    try:
+        key = f"{SWR_CACHE_PREFIX}audit_hourly:{query_shape_digest(args)}"
+        return get_stale_while_revalidate(
+            key,
+            "audit_hourly",
+            args=args,
+            soft_ttl=AUDIT_HOURLY_SOFT_TTL,
+            hard_ttl=AUDIT_HOURLY_HARD_TTL,
+            version=get_collection_version("audit_log"),
+        )
+    except Exception as e:
+        logger.error(red + f"Hourly audit counts cache unavailable: {e}" + reset)
+        return _count_per_hour(*args)
@@ -0,0 +1,175 @@
+# Binary codecs for Redis cache values (ObjectId / datetime / Decimal128 safe).
+import os
+import json
+import zlib
+import logging
+import decimal
+from datetime import datetime
+import bson
+from bson import ObjectId, Decimal128
+from utils.helpers import blue, reset
+
+# Optional dependencies, the codec falls back when they are not installed.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Blob layout: MAGIC | codec id | compression id | payload
+MAGIC = b"\xc5"
+CODECS = {"json": 1, "bson": 2, "msgpack": 3}
+COMPRESSIONS = {"none": 0, "zstd": 1, "lz4": 2, "zlib": 3}
+
+CACHE_CODEC = os.getenv("CACHE_CODEC", "bson")
+# zlib is in the standard library; zstd / lz4 need their package installed
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "zlib")
+CACHE_ZLIB_LEVEL = int(os.getenv("CACHE_ZLIB_LEVEL", 1))
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", 1024))
+
+# msgpack extension type codes
+_EXT_OBJECTID = 1
+_EXT_DATETIME = 2
+_EXT_DECIMAL128 = 3
+_EXT_DECIMAL = 4
+
+
+def available_codecs():
+    return [name for name in CODECS if name != "msgpack" or msgpack is not None]
+
+
+def available_compressions():
+    names = ["none", "zlib"]
+    if zstandard is not None:
+        names.append("zstd")
+    if lz4_frame is not None:
+        names.append("lz4")
+    return names
+
+
+_warned = set()
+
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        logger.warning(blue + message + reset)
+
+
+def _resolve(codec, compression):
+    codec = codec or CACHE_CODEC
+    compression = compression or CACHE_COMPRESSION
+    if codec not in available_codecs():
+        _warn_once(f"Cache codec '{codec}' unavailable, using bson")
+        codec = "bson"
+    if compression not in available_compressions():
+        _warn_once(f"Compression '{compression}' unavailable, using zlib")
+        compression = "zlib"
+    return codec, compression
+
+
+def _msgpack_default(value):
+    if isinstance(value, ObjectId):
+        return msgpack.ExtType(_EXT_OBJECTID, value.binary)
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, Decimal128):
+        return msgpack.ExtType(_EXT_DECIMAL128, value.bid)
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode())
+    raise TypeError(f"Cannot serialise {type(value).__name__} for the cache")
+
+
+def _msgpack_ext_hook(code, data):
+    if code == _EXT_OBJECTID:
+        return ObjectId(data)
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL128:
+        return Decimal128.from_bid(data)
+    if code == _EXT_DECIMAL:
+        return decimal.Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def _serialise(value, codec):
+    if codec == "bson":
+        # BSON needs a document at the top level
+        return bson.encode({"v": value})
+    if codec == "msgpack":
+        return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    return json.dumps(value).encode()
+
+
+def _deserialise(payload, codec):
+    if codec == "bson":
+        return bson.decode(payload)["v"]
+    if codec == "msgpack":
+        return msgpack.unpackb(
+            payload, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False
+        )
+    return json.loads(payload)
+
+
+def _compress(payload, compression):
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    if compression == "lz4":
+        return lz4_frame.compress(payload)
+    if compression == "zlib":
+        return zlib.compress(payload, CACHE_ZLIB_LEVEL)
+    return payload
+
+
+def _decompress(payload, compression):
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if compression == "lz4":
+        return lz4_frame.decompress(payload)
+    if compression == "zlib":
+        return zlib.decompress(payload)
+    return payload
+
+
+def encode(value, codec=None, compression=None, min_bytes=None):
+
+    codec, compression = _resolve(codec, compression)
+    payload = _serialise(value, codec)
+    threshold = CACHE_COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+    if compression != "none" and len(payload) >= threshold:
+        payload = _compress(payload, compression)
+    else:
+        compression = "none"
+    return MAGIC + bytes([CODECS[codec], COMPRESSIONS[compression]]) + payload
+
+
+def decode(blob):
+
+    if blob is None:
+        return None
+    if isinstance(blob, str):
+        blob = blob.encode()
+    # Values written before the codec existed are plain JSON
+    if not blob.startswith(MAGIC):
+        return json.loads(blob)
+
+    codec_id, compression_id = blob[1], blob[2]
+    codec = next(name for name, code in CODECS.items() if code == codec_id)
+    compression = next(
+        name for name, code in COMPRESSIONS.items() if code == compression_id
+    )
+    return _deserialise(_decompress(blob[3:], compression), codec)
@@ -1,7 +1,19 @@
 # Mongo operations
 import logging
-from pymongo.errors import PyMongoError
-from db.redis_operations import get_cache, set_cache, delete_cache
+from itertools import islice
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import PyMongoError, BulkWriteError
+from db.redis_operations import (
+    delete_cache,
+    get_or_compute,
+    get_many_cache,
+    set_many_cache,
+    get_collection_version,
+    bump_collection_version,
+    query_cache_key,
+    QUERY_CACHE_ENABLED,
+    DOC_CACHE_PREFIX,
+)
 from connection.connect_db import get_collection, MONGO_COLLECTIONS
 from utils.helpers import green, blue, red, reset
 
@@ -11,6 +23,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BULK_BATCH_SIZE = 1000
+
+# Credentials, lock state and device fingerprints are always read from Mongo,
+# never from the shared Redis/L1 caches.
+UNCACHED_COLLECTIONS = ("admin", "admin_log")
+
 
 def insert_document(collection_key: str, document: dict, cache_key: str = None):
 
@@ -18,7 +36,7 @@ def insert_document(collection_key: str, document: dict, cache_key: str = None):
         collection_name = MONGO_COLLECTIONS.get(collection_key)
         if not collection_name:
             raise ValueError(f"Invalid collection key: {collection_key}")
-        collection = get_collection(collection_name)
+        collection = get_collection(collection_key)
 
         if collection is None:
             raise ValueError(f"Collection '{collection_name}' not found.")
@@ -26,6 +44,7 @@ def insert_document(collection_key: str, document: dict, cache_key: str = None):
         result = collection.insert_one(document)
         if result.inserted_id:
             logger.info(green + f"Document added to {collection_name}" + reset)
+            bump_collection_version(collection_key)
             if cache_key:
                 delete_cache(cache_key)  # Clear cache for related queries
         else:
@@ -38,6 +57,59 @@ def insert_document(collection_key: str, document: dict, cache_key: str = None):
         )
 
 
+def _sort_spec(sort_by):
+    # Accept ("field", -1) as well as [("field", -1), ("_id", -1)], and the
+    # list forms of both (what a tuple becomes after a JSON round trip)
+    if not sort_by:
+        return None
+    if isinstance(sort_by, str):
+        return [(sort_by, 1)]
+    if len(sort_by) == 2 and isinstance(sort_by[0], str):
+        return [tuple(sort_by)]
+    return [tuple(pair) for pair in sort_by]
+
+
+def iter_documents(
+    collection_key: str,
+    query: dict = None,
+    projection: dict = None,
+    limit: int = 0,
+    sort_by: tuple = None,
+    batch_size: int = 1000,
+    hint=None,
+    max_time_ms: int = None,
+):
+
+    collection_name = MONGO_COLLECTIONS.get(collection_key)
+    if not collection_name:
+        raise ValueError(f"Invalid collection key: {collection_key}")
+    collection = get_collection(collection_key)
+
+    cursor = collection.find(query or {}, projection, batch_size=batch_size)
+    sort_spec = _sort_spec(sort_by)
+    if sort_spec:
+        cursor = cursor.sort(sort_spec)
+    if limit:
+        cursor = cursor.limit(limit)
+    if hint:
+        cursor = cursor.hint(hint)
+    if max_time_ms:
+        cursor = cursor.max_time_ms(max_time_ms)
+
+    # Only one batch is held in memory at a time, the cursor is closed even when
+    # the caller stops iterating early.
+    try:
+        for document in cursor:
+            yield document
+    except PyMongoError as e:
+        logger.error(
+            red + f"Cursor on {collection_name} failed while streaming: {e}" + reset
+        )
+        raise
+    finally:
+        cursor.close()
+
+
 def find_documents(
     collection_key: str,
     query: dict = None,
@@ -45,55 +117,132 @@ def find_documents(
     sort_by: tuple = None,
     cache_key: str = None,
     expiry: int = 3600,
+    projection: dict = None,
+    use_cache: bool = True,
 ):
 
     try:
-        # Check Redis cache first
-        if cache_key:
-            cached_result = get_cache(cache_key)
-            if cached_result:
-                logger.info(green + f"Cache hit for key: {cache_key}" + reset)
-                return cached_result
+        if collection_key in UNCACHED_COLLECTIONS:
+            use_cache, cache_key = False, None
+        # Without a hand-picked key, derive one from the query shape and the
+        # collection's write version (any write orphans every cached query).
+        if not cache_key and use_cache and QUERY_CACHE_ENABLED:
+            version = get_collection_version(collection_key)
+            if version is not None:
+                cache_key = query_cache_key(
+                    collection_key, version, query, sort_by, limit, projection
+                )
 
-        # Query MongoDB if no cache
-        collection_name = MONGO_COLLECTIONS.get(collection_key)
-        if not collection_name:
-            raise ValueError(f"Invalid collection key: {collection_key}")
-        collection = get_collection(collection_name)
-        query = query or {}
-        cursor = collection.find(query)
+        def query_mongo():
+            documents = list(
+                iter_documents(
+                    collection_key,
+                    query,
+                    projection=projection,
+                    limit=limit,
+                    sort_by=sort_by,
+                )
+            )
+            logger.info(
+                green
+                + f"Retrieved {len(documents)} documents from {collection_key}"
+                + reset
+            )
+            return documents
 
-        if sort_by:
-            cursor = cursor.sort(sort_by)
-        if limit:
-            cursor = cursor.limit(limit)
+        if not cache_key:
+            return query_mongo()
 
-        documents = list(cursor)
-        logger.info(
-            green
-            + f"Retrieved {len(documents)} documents from {collection_name}"
+        # Cached path: one caller recomputes a missing/expiring key, the rest
+        # wait briefly or get the stale value.
+        return get_or_compute(cache_key, query_mongo, expiry)
+    except PyMongoError as e:
+        logger.error(
+            red + f"Failed to retrieve documents from {collection_key}: {e}" + reset
+        )
+        return []
+    except Exception as e:
+        logger.error(
+            red
+            + f"Unexpected error retrieving documents from {collection_key}: {e}"
             + reset
         )
+        return []
 
-        # Store result in cache
-        if cache_key:
-            set_cache(cache_key, documents, expiry)
 
-        return documents
+def aggregate_documents(
+    collection_key: str,
+    pipeline: list,
+    max_time_ms: int = None,
+    allow_disk_use: bool = False,
+):
+
+    try:
+        collection_name = MONGO_COLLECTIONS.get(collection_key)
+        if not collection_name:
+            raise ValueError(f"Invalid collection key: {collection_key}")
+        collection = get_collection(collection_key)
+        options = {"allowDiskUse": allow_disk_use}
+        if max_time_ms:
+            options["maxTimeMS"] = max_time_ms
+        with collection.aggregate(pipeline, **options) as cursor:
+            return list(cursor)
     except PyMongoError as e:
         logger.error(
-            red + f"Failed to retrieve documents from {collection_key}: {e}" + reset
+            red + f"Failed to aggregate documents in {collection_key}: {e}" + reset
         )
         return []
     except Exception as e:
         logger.error(
             red
-            + f"Unexpected error retrieving documents from {collection_key}: {e}"
+            + f"Unexpected error aggregating documents in {collection_key}: {e}"
             + reset
         )
         return []
 
 
+def find_many_cached(collection_key: str, field: str, values, expiry: int = 3600):
+
+    # One cached document per value of `field` (e.g. one per company). Hits come
+    # from one MGET, all misses from one $in query, then one pipelined SETEX.
+    try:
+        values = list(dict.fromkeys(values))
+        if collection_key in UNCACHED_COLLECTIONS:
+            return {
+                document[field]: document
+                for document in iter_documents(collection_key, {field: {"$in": values}})
+            }
+        version = get_collection_version(collection_key)
+        prefix = f"{DOC_CACHE_PREFIX}{collection_key}:v{version}:{field}:"
+        hits, missing_keys = get_many_cache([prefix + str(value) for value in values])
+        found = {
+            value: hits[prefix + str(value)]
+            for value in values
+            if prefix + str(value) in hits
+        }
+
+        missing = [value for value in values if prefix + str(value) in missing_keys]
+        if missing:
+            fetched = {
+                document[field]: document
+                for document in iter_documents(
+                    collection_key, {field: {"$in": missing}}
+                )
+            }
+            if version is not None:
+                set_many_cache(
+                    {prefix + str(value): doc for value, doc in fetched.items()},
+                    expiry,
+                )
+            found.update(fetched)
+        return found
+    except Exception as e:
+        logger.error(
+            red + f"Failed to retrieve documents from {collection_key}: {e}" + reset
+        )
+        return {}
+
+
 def update_documents(
     collection_key: str,
     query: dict,
@@ -106,7 +255,7 @@ def update_documents(
         collection_name = MONGO_COLLECTIONS.get(collection_key)
         if not collection_name:
             raise ValueError(f"Invalid collection key: {collection_key}")
-        collection = get_collection(collection_name)
+        collection = get_collection(collection_key)
         if "$set" not in update_data:
             update_data = {"$set": update_data}
 
@@ -120,6 +269,8 @@ def update_documents(
             + f"Updated: {result.modified_count} document(s) in {collection_name}"
             + reset
         )
+        if result.modified_count or result.upserted_id is not None:
+            bump_collection_version(collection_key)
 
         # Clear cache if applicable
         if cache_key:
@@ -148,7 +299,7 @@ def delete_documents(
         collection_name = MONGO_COLLECTIONS.get(collection_key)
         if not collection_name:
             raise ValueError(f"Invalid collection key: {collection_key}")
-        collection = get_collection(collection_name)
+        collection = get_collection(collection_key)
         result = (
             collection.delete_many(query) if multiple else collection.delete_one(query)
         )
@@ -157,6 +308,8 @@ def delete_documents(
             + f"Deleted {result.deleted_count} document(s) from {collection_name}"
             + reset
         )
+        if result.deleted_count:
+            bump_collection_version(collection_key)
 
         # Clear cache if applicable
         if cache_key:
@@ -175,3 +328,131 @@ def delete_documents(
             + reset
         )
         return 0
+
+
+#
+# ---- Bulk writes --->
+#
+
+
+def _batches(iterable, batch_size):
+    # Chunk any iterable (lists, generators, cursors) without materialising it.
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _bulk_write(collection_key, requests, batch_size, ordered, cache_key):
+
+    collection_name = MONGO_COLLECTIONS.get(collection_key)
+    if not collection_name:
+        raise ValueError(f"Invalid collection key: {collection_key}")
+    collection = get_collection(collection_key)
+
+    results = []
+    for number, batch in enumerate(_batches(requests, batch_size)):
+        report = {
+            "batch": number,
+            "size": len(batch),
+            "inserted": 0,
+            "upserted": 0,
+            "matched": 0,
+            "modified": 0,
+            "errors": [],
+        }
+        try:
+            result = collection.bulk_write(batch, ordered=ordered)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            # Unordered batches keep going after a failure, the details still
+            # hold the counts for everything that did get written.
+            details = e.details
+            report["errors"] = [
+                {
+                    "index": error.get("index"),
+                    "code": error.get("code"),
+                    "message": error.get("errmsg"),
+                }
+                for error in details.get("writeErrors", [])
+            ]
+        except PyMongoError as e:
+            details = {}
+            report["errors"] = [{"index": None, "code": None, "message": str(e)}]
+
+        report["inserted"] = details.get("nInserted", 0)
+        report["upserted"] = details.get("nUpserted", 0)
+        report["matched"] = details.get("nMatched", 0)
+        report["modified"] = details.get("nModified", 0)
+        results.append(report)
+
+        # Invalidate once per batch, not once per document
+        if report["inserted"] or report["upserted"] or report["modified"]:
+            bump_collection_version(collection_key)
+        if cache_key:
+            delete_cache(cache_key)
+
+        if report["errors"]:
+            logger.warning(
+                blue
+                + f"Batch {number} into {collection_name}: {len(report['errors'])} error(s)"
+                + reset
+            )
+            if ordered:
+                break
+        else:
+            logger.info(
+                green
+                + f"Batch {number} into {collection_name}: {report['inserted']} inserted, "
+                + f"{report['upserted']} upserted, {report['modified']} modified"
+                + reset
+            )
+
+    return results
+
+
+def bulk_insert_documents(
+    collection_key: str,
+    documents,
+    batch_size: int = BULK_BATCH_SIZE,
+    ordered: bool = False,
+    cache_key: str = None,
+):
+
+    try:
+        requests = (InsertOne(document) for document in documents)
+        return _bulk_write(collection_key, requests, batch_size, ordered, cache_key)
+    except Exception as e:
+        logger.error(
+            red + f"Error bulk inserting documents into {collection_key}: {e}" + reset
+        )
+        return []
+
+
+def bulk_upsert_documents(
+    collection_key: str,
+    documents,
+    key_fields: tuple,
+    batch_size: int = BULK_BATCH_SIZE,
+    ordered: bool = False,
+    cache_key: str = None,
+):
+
+    try:
+        if isinstance(key_fields, str):
+            key_fields = (key_fields,)
+
+        def to_request(document):
+            query = {field: document[field] for field in key_fields}
+            update = {k: v for k, v in document.items() if k != "_id"}
+            return UpdateOne(query, {"$set": update}, upsert=True)
+
+        requests = (to_request(document) for document in documents)
+        return _bulk_write(collection_key, requests, batch_size, ordered, cache_key)
+    except Exception as e:
+        logger.error(
+            red + f"Error bulk upserting documents into {collection_key}: {e}" + reset
+        )
+        return []
@@ -0,0 +1,274 @@
+# Index registry, applied on boot by Flask, the Celery worker and the seeder.
+import logging
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from connection.connect_db import get_db, MONGO_COLLECTIONS
+from db.retention import (
+    RETENTION_POLICIES,
+    ensure_retention_collections,
+    is_timeseries,
+    retention_seconds,
+)
+from utils.helpers import green, blue, red, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Options compared against the server when looking for drift
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# The _id suffixes back keyset pagination in web/data.py
+_FUND_INDEXES = [
+    {
+        "name": "company_filing_date_id",
+        "keys": [
+            ("company_name", ASCENDING),
+            ("filing_date", DESCENDING),
+            ("_id", DESCENDING),
+        ],
+    },
+    {
+        "name": "filing_date_id",
+        "keys": [("filing_date", DESCENDING), ("_id", DESCENDING)],
+    },
+]
+_COMPANY_INDEXES = [
+    {
+        "name": "company_name_id",
+        "keys": [("company_name", ASCENDING), ("_id", ASCENDING)],
+    },
+]
+
+# One entry per MONGO_COLLECTIONS key. Each index: name, keys and any of
+# INDEX_OPTIONS (unique, TTL through expireAfterSeconds, ...).
+INDEX_SPECS = {
+    "admin": [
+        {"name": "email_unique", "keys": [("email", ASCENDING)], "unique": True},
+        {"name": "name_unique", "keys": [("name", ASCENDING)], "unique": True},
+    ],
+    "admin_log": [
+        {"name": "fingerprint_digest", "keys": [("fingerprint_digest", ASCENDING)]},
+    ],
+    # (timestamp, _id) suffix backs keyset pagination in db/audit.py
+    "audit_log": [
+        {
+            "name": "user_timestamp_id",
+            "keys": [
+                ("user_id", ASCENDING),
+                ("timestamp", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+        },
+        {
+            "name": "action_timestamp_id",
+            "keys": [
+                ("action", ASCENDING),
+                ("timestamp", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+        },
+        {
+            "name": "timestamp_id",
+            "keys": [("timestamp", DESCENDING), ("_id", DESCENDING)],
+        },
+        # Only used when audit_log is not a time-series collection (those
+        # expire through the collection's own expireAfterSeconds)
+        {
+            "name": "timestamp_ttl",
+            "keys": [("timestamp", ASCENDING)],
+            "expireAfterSeconds": retention_seconds("audit_log"),
+        },
+    ],
+    "renaissance": _FUND_INDEXES,
+    "bridgewater": _FUND_INDEXES,
+    "citadel": _FUND_INDEXES,
+    "top_company": _COMPANY_INDEXES,
+    "starting_profit": _COMPANY_INDEXES,
+}
+
+
+# Names an earlier spec used, dropped by ensure_indexes once the index that
+# replaces them exists: {collection key: {old name: new name}}
+SUPERSEDED_INDEXES = {
+    "audit_log": {
+        "user_timestamp": "user_timestamp_id",
+        "action_timestamp": "action_timestamp_id",
+        "timestamp": "timestamp_id",
+    },
+    **{
+        fund: {
+            "company_filing_date": "company_filing_date_id",
+            "filing_date": "filing_date_id",
+        }
+        for fund in ("renaissance", "bridgewater", "citadel")
+    },
+    "top_company": {"company_name": "company_name_id"},
+    "starting_profit": {"company_name": "company_name_id"},
+}
+
+# Time-series collections only index measurement fields (anything but the
+# time and meta fields, e.g. action or _id) from MongoDB 6.0 on
+TIMESERIES_MEASUREMENT_INDEX_VERSION = (6, 0)
+
+
+def _index_model(spec):
+    options = {key: spec[key] for key in INDEX_OPTIONS if key in spec}
+    return IndexModel(spec["keys"], name=spec["name"], **options)
+
+
+def _collection_for(db, collection_key):
+    collection_name = MONGO_COLLECTIONS.get(collection_key)
+    if not collection_name:
+        raise ValueError(f"Invalid collection key: {collection_key}")
+    return db[collection_name]
+
+
+def _server_version():
+    try:
+        return tuple(get_db().client.server_info()["versionArray"][:2])
+    except (PyMongoError, KeyError):
+        return (0, 0)
+
+
+def _specs_for(collection_key):
+    specs = INDEX_SPECS.get(collection_key, [])
+    if is_timeseries(collection_key):
+        specs = [spec for spec in specs if "expireAfterSeconds" not in spec]
+        if _server_version() < TIMESERIES_MEASUREMENT_INDEX_VERSION:
+            options = RETENTION_POLICIES[collection_key]["timeseries"]
+            allowed = {options["timeField"], options.get("metaField")}
+            skipped = [
+                spec["name"]
+                for spec in specs
+                if not {field for field, _ in spec["keys"]} <= allowed
+            ]
+            if skipped:
+                logger.warning(
+                    blue
+                    + f"{collection_key} is time-series on MongoDB < 6.0, "
+                    + f"skipping measurement-field indexes: {skipped}"
+                    + reset
+                )
+            specs = [spec for spec in specs if spec["name"] not in skipped]
+    return {spec["name"]: spec for spec in specs}
+
+
+def _drop_superseded(collection, collection_key, specs, report):
+
+    # Old names are only dropped once their replacement is in place, so
+    # queries never lose their index in between
+    for old, new in SUPERSEDED_INDEXES.get(collection_key, {}).items():
+        if old not in report["extra"] or new not in specs or new in report["missing"]:
+            continue
+        try:
+            collection.drop_index(old)
+            report["extra"].remove(old)
+            logger.info(
+                green + f"Dropped {collection_key}.{old}, replaced by {new}" + reset
+            )
+        except PyMongoError as e:
+            logger.error(red + f"Failed to drop {collection_key}.{old}: {e}" + reset)
+
+
+def index_drift(collection_keys=None):
+
+    db = get_db()
+    drift = {}
+    for collection_key in collection_keys or INDEX_SPECS:
+        specs = _specs_for(collection_key)
+        try:
+            existing = _collection_for(db, collection_key).index_information()
+        except PyMongoError as e:
+            logger.error(
+                red + f"Could not read indexes of {collection_key}: {e}" + reset
+            )
+            continue
+        existing.pop("_id_", None)
+
+        report = {"missing": [], "extra": [], "changed": []}
+        for name, spec in specs.items():
+            server = existing.get(name)
+            if server is None:
+                report["missing"].append(name)
+                continue
+            wanted_keys = [(field, direction) for field, direction in spec["keys"]]
+            server_keys = [(field, direction) for field, direction in server["key"]]
+            changed = wanted_keys != server_keys or any(
+                spec.get(option) != server.get(option) for option in INDEX_OPTIONS
+            )
+            if changed:
+                report["changed"].append(name)
+        report["extra"] = [name for name in existing if name not in specs]
+        drift[collection_key] = report
+    return drift
+
+
+def ensure_indexes(collection_keys=None):
+
+    db = get_db()
+    # Time-series collections must exist before any index creates them
+    ensure_retention_collections()
+    drift = index_drift(collection_keys)
+    for collection_key, report in drift.items():
+        collection = _collection_for(db, collection_key)
+        specs = _specs_for(collection_key)
+
+        # A TTL change is applied in place, every other change needs a manual
+        # drop/rebuild so it is only reported.
+        server_indexes = collection.index_information() if report["changed"] else {}
+        for name in list(report["changed"]):
+            spec = specs[name]
+            server = server_indexes.get(name, {})
+            only_ttl = list(server.get("key", [])) == list(spec["keys"]) and all(
+                spec.get(option) == server.get(option)
+                for option in INDEX_OPTIONS
+                if option != "expireAfterSeconds"
+            )
+            if only_ttl and "expireAfterSeconds" in spec:
+                try:
+                    db.command(
+                        "collMod",
+                        collection.name,
+                        index={
+                            "name": name,
+                            "expireAfterSeconds": spec["expireAfterSeconds"],
+                        },
+                    )
+                    report["changed"].remove(name)
+                    logger.info(
+                        green + f"Updated TTL of {collection_key}.{name}" + reset
+                    )
+                except PyMongoError as e:
+                    logger.error(
+                        red
+                        + f"Failed to update TTL of {collection_key}.{name}: {e}"
+                        + reset
+                    )
+
+        missing = [_index_model(specs[name]) for name in report["missing"]]
+        if missing:
+            try:
+                collection.create_indexes(missing)
+                logger.info(
+                    green
+                    + f"Created {len(missing)} index(es) on {collection_key}"
+                    + reset
+                )
+                report["missing"] = []
+            except PyMongoError as e:
+                logger.error(
+                    red + f"Failed to create indexes on {collection_key}: {e}" + reset
+                )
+
+        _drop_superseded(collection, collection_key, specs, report)
+
+        if report["changed"] or report["extra"]:
+            logger.warning(
+                blue
+                + f"Index drift on {collection_key}: changed={report['changed']} "
+                + f"extra={report['extra']}"
+                + reset
+            )
+    return drift
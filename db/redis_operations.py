@@ -1,20 +1,198 @@
-from connection.connect_redis import get_redis_client
+from connection.connect_redis import get_cache_redis_client
+from db.cache_codec import encode, decode
 from utils.helpers import green, blue, red, reset
+import os
+import math
+import time
+import random
+import uuid
+import socket
 import logging
+import hashlib
 import json
-
-redis_client = get_redis_client()
+import threading
+from collections import OrderedDict
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+# Per-collection write counters, bumped on every write so cached queries over
+# that collection are orphaned in O(1). These keys have no TTL on purpose.
+QUERY_VERSION_PREFIX = "query_version:"
+QUERY_CACHE_PREFIX = "query:"
+DOC_CACHE_PREFIX = "doc:"
+SWR_CACHE_PREFIX = "swr:"
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+
+
+# In-process L1 tier in front of Redis, kept coherent over pub/sub.
+L1_CACHE_ENABLED = os.getenv("L1_CACHE_ENABLED", "true").lower() == "true"
+L1_CACHE_MAX_ENTRIES = int(os.getenv("L1_CACHE_MAX_ENTRIES", 1024))
+L1_CACHE_TTL = int(os.getenv("L1_CACHE_TTL", 60))
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+
+_stats_lock = threading.Lock()
+_stats = {
+    "l1": {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0},
+    "l2": {"hits": 0, "misses": 0, "errors": 0},
+    "swr": {"fresh": 0, "stale": 0, "misses": 0, "refreshes": 0, "errors": 0},
+}
+# count / total / max per measured duration (seconds)
+_timings = {
+    "swr_refresh_seconds": [0, 0.0, 0.0],
+    "swr_age_at_serve_seconds": [0, 0.0, 0.0],
+}
+
+
+def _count(tier, counter, amount=1):
+    with _stats_lock:
+        _stats[tier][counter] += amount
+
+
+def _observe(timing, seconds):
+    with _stats_lock:
+        summary = _timings[timing]
+        summary[0] += 1
+        summary[1] += seconds
+        summary[2] = max(summary[2], seconds)
+
+
+def get_cache_stats():
+    with _stats_lock:
+        stats = {tier: dict(counters) for tier, counters in _stats.items()}
+        stats["timings"] = {
+            name: {"count": count, "total": total, "max": longest}
+            for name, (count, total, longest) in _timings.items()
+        }
+        return stats
+
+
+class _LocalCache:
+    # Bounded LRU with a TTL per entry. Holds the encoded blob, not the decoded
+    # value, so callers never share (and mutate) the same object.
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every eviction, a read that raced an invalidation must not
+        # put its (possibly stale) value back.
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            blob, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                _count("l1", "evictions")
+                return None
+            self._entries.move_to_end(key)
+            return blob
+
+    def set(self, key, blob, ttl=None, generation=None):
+        ttl = min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (blob, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                _count("l1", "evictions")
+
+    def evict(self, key):
+        with self._lock:
+            self.generation += 1
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
 
-def set_cache(key, value, expiry=3600):
 
+_local_cache = _LocalCache(L1_CACHE_MAX_ENTRIES, L1_CACHE_TTL)
+_listener = {"pid": None, "origin": None, "thread": None, "ready": threading.Event()}
+_listener_lock = threading.Lock()
+
+
+def _listen_for_invalidations(pid, origin, ready):
+
+    backoff = 0.5
+    while _listener["pid"] == pid:
+        pubsub = get_cache_redis_client().pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            ready.set()
+            backoff = 0.5
+            while _listener["pid"] == pid:
+                message = pubsub.get_message(timeout=1.0)
+                if not message:
+                    continue
+                sender, _, key = message["data"].decode().partition("|")
+                if sender != origin and _local_cache.evict(key):
+                    _count("l1", "invalidations")
+        except Exception as e:
+            # Missed messages cannot be replayed, so nothing in L1 is trusted
+            ready.clear()
+            _local_cache.clear()
+            logger.error(red + f"Cache invalidation listener lost: {e}" + reset)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            pubsub.close()
+
+
+def _l1_active():
+
+    if not L1_CACHE_ENABLED:
+        return False
+    pid = os.getpid()
+    if _listener["pid"] != pid:
+        with _listener_lock:
+            if _listener["pid"] != pid:
+                # First use in this process (or first use after a fork)
+                _local_cache.clear()
+                ready = threading.Event()
+                origin = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+                _listener.update(pid=pid, origin=origin, ready=ready)
+                _listener["thread"] = threading.Thread(
+                    target=_listen_for_invalidations,
+                    args=(pid, origin, ready),
+                    name="cache-invalidation",
+                    daemon=True,
+                )
+                _listener["thread"].start()
+    # Serve from L1 only while we are subscribed, otherwise entries may be stale
+    return _listener["ready"].is_set()
+
+
+def _publish_invalidation(key):
+
+    if not L1_CACHE_ENABLED:
+        return
     try:
-        redis_client.setex(key, expiry, json.dumps(value))
+        get_cache_redis_client().publish(
+            CACHE_INVALIDATION_CHANNEL, f"{_listener['origin']}|{key}"
+        )
+    except Exception as e:
+        logger.error(red + f"Failed to publish invalidation for {key}: {e}" + reset)
+
+
+def set_cache(key, value, expiry=3600, codec=None, compression=None):
+
+    try:
+        blob = encode(value, codec, compression)
+        get_cache_redis_client().setex(key, expiry, blob)
+        if _l1_active():
+            _local_cache.set(key, blob, expiry)
+        _publish_invalidation(key)
         logger.info(green + f"Cache set for key: {key}" + reset)
     except Exception as e:
         logger.error(red + f"Failed to set cache for key: {key}. Error: {e}" + reset)
@@ -23,13 +201,33 @@ def set_cache(key, value, expiry=3600):
 def get_cache(key):
 
     try:
-        value = redis_client.get(key)
+        l1_active = _l1_active()
+        if l1_active:
+            blob = _local_cache.get(key)
+            if blob is not None:
+                _count("l1", "hits")
+                return decode(blob)
+            _count("l1", "misses")
+            generation = _local_cache.generation
+            # Value and remaining TTL in one round trip
+            pipe = get_cache_redis_client().pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            value, ttl_ms = pipe.execute()
+        else:
+            value = get_cache_redis_client().get(key)
+
         if value:
+            _count("l2", "hits")
             logger.info(blue + f"Cache hit for key: {key}" + reset)
-            return json.loads(value)
+            if l1_active and ttl_ms and ttl_ms > 0:
+                _local_cache.set(key, value, ttl_ms / 1000, generation)
+            return decode(value)
+        _count("l2", "misses")
         logger.info(blue + f"Cache miss for key: {key}" + reset)
         return None
     except Exception as e:
+        _count("l2", "errors")
         logger.error(red + f"Failed to get cache for key: {key}. Error: {e}" + reset)
         return None
 
@@ -37,7 +235,455 @@ def get_cache(key):
 def delete_cache(key):
 
     try:
-        redis_client.delete(key)
+        _local_cache.evict(key)
+        get_cache_redis_client().delete(key)
+        _publish_invalidation(key)
         logger.info(green + f"Cache cleared for key: {key}" + reset)
     except Exception as e:
         logger.error(red + f"Failed to clear cache for key: {key}. Error: {e}" + reset)
+
+
+#
+# ---- Batched operations --->
+#
+
+BATCH_CHUNK_SIZE = 500
+
+
+def _chunks(items, size=BATCH_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def get_many_cache(keys):
+
+    # Returns ({key: value} for hits, [keys still missing]) so the caller can
+    # fetch only the missing items, e.g. with one $in query.
+    keys = list(dict.fromkeys(keys))
+    hits = {}
+    try:
+        l1_active = _l1_active()
+        remaining = []
+        for key in keys:
+            blob = _local_cache.get(key) if l1_active else None
+            if blob is not None:
+                _count("l1", "hits")
+                hits[key] = decode(blob)
+            else:
+                remaining.append(key)
+        if l1_active:
+            _count("l1", "misses", len(remaining))
+        if not remaining:
+            return hits, []
+
+        generation = _local_cache.generation
+        # MGET plus the TTLs (for L1) in a single round trip
+        pipe = get_cache_redis_client().pipeline(transaction=False)
+        pipe.mget(remaining)
+        for key in remaining:
+            pipe.pttl(key)
+        values, *ttls = pipe.execute()
+
+        missing = []
+        for key, value, ttl_ms in zip(remaining, values, ttls):
+            if value is None:
+                missing.append(key)
+                continue
+            hits[key] = decode(value)
+            if l1_active and ttl_ms and ttl_ms > 0:
+                _local_cache.set(key, value, ttl_ms / 1000, generation)
+        _count("l2", "hits", len(remaining) - len(missing))
+        _count("l2", "misses", len(missing))
+        logger.info(
+            blue
+            + f"Cache multi-get: {len(hits)} hit(s), {len(missing)} miss(es)"
+            + reset
+        )
+        return hits, missing
+    except Exception as e:
+        _count("l2", "errors")
+        logger.error(red + f"Failed multi-get for {len(keys)} key(s): {e}" + reset)
+        return hits, [key for key in keys if key not in hits]
+
+
+def set_many_cache(mapping, expiry=3600, codec=None, compression=None):
+
+    try:
+        l1_active = _l1_active()
+        items = list(mapping.items())
+        for chunk in _chunks(items):
+            pipe = get_cache_redis_client().pipeline(transaction=False)
+            for key, value in chunk:
+                blob = encode(value, codec, compression)
+                pipe.setex(key, expiry, blob)
+                if l1_active:
+                    _local_cache.set(key, blob, expiry)
+                if L1_CACHE_ENABLED:
+                    pipe.publish(
+                        CACHE_INVALIDATION_CHANNEL, f"{_listener['origin']}|{key}"
+                    )
+            pipe.execute()
+        logger.info(green + f"Cache set for {len(items)} key(s)" + reset)
+    except Exception as e:
+        logger.error(red + f"Failed multi-set for {len(mapping)} key(s): {e}" + reset)
+
+
+def delete_many_cache(keys):
+
+    # UNLINK frees the values off the main Redis thread
+    keys = list(keys)
+    deleted = 0
+    try:
+        for chunk in _chunks(keys):
+            for key in chunk:
+                _local_cache.evict(key)
+            pipe = get_cache_redis_client().pipeline(transaction=False)
+            pipe.unlink(*chunk)
+            if L1_CACHE_ENABLED:
+                for key in chunk:
+                    pipe.publish(
+                        CACHE_INVALIDATION_CHANNEL, f"{_listener['origin']}|{key}"
+                    )
+            deleted += pipe.execute()[0]
+        logger.info(green + f"Cache cleared for {deleted} key(s)" + reset)
+    except Exception as e:
+        logger.error(red + f"Failed multi-delete for {len(keys)} key(s): {e}" + reset)
+    return deleted
+
+
+#
+# ---- Maintenance sweeps --->
+#
+
+SWEEP_CURSOR_PREFIX = "maintenance:cursor:"
+SWEEP_SCAN_COUNT = int(os.getenv("SWEEP_SCAN_COUNT", 1000))
+SWEEP_MAX_KEYS = int(os.getenv("SWEEP_MAX_KEYS", 1000000))
+SWEEP_MAX_SECONDS = int(os.getenv("SWEEP_MAX_SECONDS", 60))
+
+
+def sweep_keys(
+    client,
+    name,
+    match="*",
+    skip_prefixes=(),
+    only_prefixes=(),
+    select=None,
+    count=SWEEP_SCAN_COUNT,
+    max_keys=SWEEP_MAX_KEYS,
+    max_seconds=SWEEP_MAX_SECONDS,
+):
+
+    # Incremental SCAN (never KEYS), UNLINKs batched per SCAN page. select(name)
+    # narrows the prefix match further. When the budget runs out the cursor is
+    # saved and the next run resumes there.
+    cursor_key = SWEEP_CURSOR_PREFIX + name
+    started = time.monotonic()
+    cursor = int(client.get(cursor_key) or 0)
+    report = {"scanned": 0, "deleted": 0, "resumed_from": cursor, "complete": False}
+
+    while True:
+        cursor, keys = client.scan(cursor=cursor, match=match, count=count)
+        report["scanned"] += len(keys)
+        names = [key.decode() if isinstance(key, bytes) else key for key in keys]
+        keys = [
+            key
+            for key, key_name in zip(keys, names)
+            if not key_name.startswith(tuple(skip_prefixes))
+            and (not only_prefixes or key_name.startswith(tuple(only_prefixes)))
+            and (select is None or select(key_name))
+        ]
+
+        if keys:
+            report["deleted"] += client.unlink(*keys)
+
+        if cursor == 0:
+            report["complete"] = True
+            client.delete(cursor_key)
+            break
+        if report["scanned"] >= max_keys or time.monotonic() - started >= max_seconds:
+            client.set(cursor_key, cursor, ex=7 * 24 * 3600)
+            break
+
+    report["cursor"] = cursor
+    report["elapsed"] = round(time.monotonic() - started, 3)
+    return report
+
+
+#
+# ---- Single-flight recompute --->
+#
+
+# Entries stay in Redis this long past their logical expiry, so callers that
+# lose the recompute lock can be served the stale value instead of waiting.
+CACHE_STALE_GRACE = int(os.getenv("CACHE_STALE_GRACE", 60))
+CACHE_LOCK_MS = int(os.getenv("CACHE_LOCK_MS", 5000))
+CACHE_LOCK_WAIT_MS = int(os.getenv("CACHE_LOCK_WAIT_MS", 2000))
+CACHE_EARLY_BETA = float(os.getenv("CACHE_EARLY_BETA", 1.0))
+CACHE_LOCK_PREFIX = "lock:"
+
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, not at import time
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_cache_redis_client().register_script(source)
+    return script
+
+
+def _is_envelope(entry):
+    return isinstance(entry, dict) and "exp" in entry and "v" in entry
+
+
+def acquire_cache_lock(key, lock_ms):
+    token = uuid.uuid4().hex
+    try:
+        if get_cache_redis_client().set(
+            CACHE_LOCK_PREFIX + key, token, nx=True, px=lock_ms
+        ):
+            return token
+    except Exception as e:
+        logger.error(red + f"Failed to take cache lock for {key}: {e}" + reset)
+    return None
+
+
+def release_cache_lock(key, token):
+    try:
+        _script(_RELEASE_LOCK)(keys=[CACHE_LOCK_PREFIX + key], args=[token])
+    except Exception as e:
+        logger.error(red + f"Failed to release cache lock for {key}: {e}" + reset)
+
+
+def _recompute(key, compute, expiry):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    envelope = {"v": value, "exp": time.time() + expiry, "delta": delta}
+    set_cache(key, envelope, expiry + CACHE_STALE_GRACE)
+    return value
+
+
+def get_or_compute(
+    key,
+    compute,
+    expiry=3600,
+    beta=CACHE_EARLY_BETA,
+    lock_ms=CACHE_LOCK_MS,
+    wait_ms=CACHE_LOCK_WAIT_MS,
+):
+
+    entry = get_cache(key)
+    if entry is not None and not _is_envelope(entry):
+        return entry  # Written by set_cache directly, nothing to refresh
+
+    if entry is not None:
+        # Probabilistic early refresh (XFetch): the closer to expiry and the
+        # slower the recompute, the likelier one caller refreshes ahead of time.
+        now = time.time()
+        jitter = -entry["delta"] * beta * math.log(1.0 - random.random())
+        if now + jitter < entry["exp"]:
+            return entry["v"]
+
+    token = acquire_cache_lock(key, lock_ms)
+    if token:
+        try:
+            return _recompute(key, compute, expiry)
+        finally:
+            release_cache_lock(key, token)
+
+    # Someone else is recomputing: serve what we have, even if stale
+    if entry is not None:
+        logger.info(blue + f"Serving stale value for key: {key}" + reset)
+        return entry["v"]
+
+    # Nothing cached at all, wait briefly for the winner
+    deadline = time.monotonic() + wait_ms / 1000
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = get_cache(key)
+        if _is_envelope(entry):
+            return entry["v"]
+
+    logger.warning(blue + f"Gave up waiting for recompute of key: {key}" + reset)
+    return compute()
+
+
+#
+# ---- Stale-while-revalidate --->
+#
+
+# Past the soft TTL the stale value is served and a Celery task refreshes it,
+# past the hard TTL (the Redis TTL) the caller recomputes inline.
+SWR_REFRESH_PREFIX = "refresh:"
+SWR_REFRESH_TASK = "tasks.refresh_cache_entry"
+
+_refreshers = {}
+
+
+def register_refresher(name, func):
+    # Refreshers are looked up by name in the worker, so they must be registered
+    # in a module both Flask and Celery import (see db/audit.py).
+    _refreshers[name] = func
+    return func
+
+
+def refresh_entry(name, key, args, soft_ttl, hard_ttl, version=None):
+
+    started = time.time()
+    try:
+        value = _refreshers[name](*args)
+    except Exception:
+        _count("swr", "errors")
+        raise
+    took = time.time() - started
+    envelope = {
+        "v": value,
+        "soft": time.time() + soft_ttl,
+        "created": time.time(),
+        "version": version,
+        "took": took,
+    }
+    set_cache(key, envelope, hard_ttl)
+    _count("swr", "refreshes")
+    _observe("swr_refresh_seconds", took)
+    logger.info(green + f"Refreshed {key} via '{name}' in {took:.3f}s" + reset)
+    return value
+
+
+def _schedule_refresh(name, key, args, soft_ttl, hard_ttl, version):
+
+    # One pending refresh per key across all processes
+    dedupe_key = SWR_REFRESH_PREFIX + key
+    try:
+        if not get_cache_redis_client().set(
+            dedupe_key, 1, nx=True, ex=max(soft_ttl, 30)
+        ):
+            return
+        from celery_app import celery
+
+        # Same fail-fast publish as utils.sendmail._enqueue: one connect
+        # attempt, no publish retries and no result subscription, so a stale
+        # read never waits on a broker that is down.
+        options = dict(celery.conf.broker_transport_options, max_retries=0)
+        with celery.connection_for_write(transport_options=options) as connection:
+            celery.send_task(
+                SWR_REFRESH_TASK,
+                args=[name, key, list(args), soft_ttl, hard_ttl, version],
+                retry=False,
+                ignore_result=True,
+                connection=connection,
+            )
+    except Exception as e:
+        get_cache_redis_client().delete(dedupe_key)
+        logger.error(red + f"Failed to schedule refresh of {key}: {e}" + reset)
+
+
+def finish_refresh(key):
+    get_cache_redis_client().delete(SWR_REFRESH_PREFIX + key)
+
+
+def get_stale_while_revalidate(
+    key, name, args=(), soft_ttl=300, hard_ttl=3600, version=None
+):
+
+    entry = get_cache(key)
+    if isinstance(entry, dict) and "soft" in entry:
+        age = time.time() - entry["created"]
+        _observe("swr_age_at_serve_seconds", age)
+        # A newer data version makes the entry stale right away
+        if time.time() < entry["soft"] and entry.get("version") == version:
+            _count("swr", "fresh")
+            return entry["v"]
+        _count("swr", "stale")
+        _schedule_refresh(name, key, args, soft_ttl, hard_ttl, version)
+        return entry["v"]
+
+    # Hard miss: recompute inline, single-flight so a cold key is built once
+    _count("swr", "misses")
+    token = acquire_cache_lock(key, CACHE_LOCK_MS)
+    if token:
+        try:
+            return refresh_entry(name, key, args, soft_ttl, hard_ttl, version)
+        finally:
+            release_cache_lock(key, token)
+
+    deadline = time.monotonic() + CACHE_LOCK_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = get_cache(key)
+        if isinstance(entry, dict) and "soft" in entry:
+            return entry["v"]
+    return _refreshers[name](*args)
+
+
+#
+# ---- Query result cache --->
+#
+
+
+def _canonical(value):
+    # Tag non-JSON types so ObjectId("x") and "x" do not hash the same.
+    return f"{type(value).__name__}:{value}"
+
+
+def get_collection_version(collection_key):
+
+    key = QUERY_VERSION_PREFIX + collection_key
+    try:
+        l1_active = _l1_active()
+        if l1_active:
+            version = _local_cache.get(key)
+            if version is not None:
+                return version
+            generation = _local_cache.generation
+        version = int(get_cache_redis_client().get(key) or 0)
+        if l1_active:
+            _local_cache.set(key, version, generation=generation)
+        return version
+    except Exception as e:
+        logger.error(
+            red + f"Failed to read cache version for {collection_key}: {e}" + reset
+        )
+        return None
+
+
+def bump_collection_version(collection_key):
+
+    key = QUERY_VERSION_PREFIX + collection_key
+    try:
+        version = get_cache_redis_client().incr(key)
+        _local_cache.evict(key)
+        _publish_invalidation(key)
+        return version
+    except Exception as e:
+        logger.error(
+            red + f"Failed to bump cache version for {collection_key}: {e}" + reset
+        )
+        return None
+
+
+def query_shape_digest(query=None, sort_by=None, limit=0, projection=None):
+
+    # Key order is kept as given: for embedded documents Mongo compares in order,
+    # so two differently ordered filters may be two different queries.
+    shape = json.dumps(
+        [query or {}, sort_by, limit or 0, projection],
+        default=_canonical,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(shape.encode()).hexdigest()
+
+
+def query_cache_key(
+    collection_key, version, query=None, sort_by=None, limit=0, projection=None
+):
+
+    digest = query_shape_digest(query, sort_by, limit, projection)
+    return f"{QUERY_CACHE_PREFIX}{collection_key}:v{version}:{digest}"
@@ -0,0 +1,188 @@
+# Retention: time-series/TTL for audit_log, rolling windows for filings.
+import os
+import logging
+from datetime import datetime, timedelta
+from pymongo.errors import PyMongoError, CollectionInvalid
+from redis.exceptions import RedisError
+from connection.connect_db import get_db, get_collection, MONGO_COLLECTIONS
+from connection.connect_redis import get_redis_client
+from db.db_operations import delete_documents
+from utils.helpers import green, blue, red, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", 365))
+FILING_RETENTION_DAYS = int(os.getenv("FILING_RETENTION_DAYS", 3 * 365))
+AUDIT_TIMESERIES = os.getenv("AUDIT_TIMESERIES", "true").lower() == "true"
+# Document count per TTL-mode collection at the last pass, see _ttl_expired
+RETENTION_LEDGER_PREFIX = "retention:ttl:"
+
+_FILING_WINDOW = {"field": "filing_date", "days": FILING_RETENTION_DAYS}
+
+# mode "ttl": Mongo expires documents itself (time-series expireAfterSeconds or
+# a TTL index from db/indexes.py), the sweep only reports storage.
+# mode "window": documents older than the window are pruned by the sweep.
+# top_company has no filing_date field, so it has no window.
+RETENTION_POLICIES = {
+    "audit_log": {
+        "mode": "ttl",
+        "field": "timestamp",
+        "days": AUDIT_RETENTION_DAYS,
+        "timeseries": (
+            {"timeField": "timestamp", "metaField": "user_id", "granularity": "minutes"}
+            if AUDIT_TIMESERIES
+            else None
+        ),
+    },
+    "renaissance": dict(_FILING_WINDOW, mode="window"),
+    "bridgewater": dict(_FILING_WINDOW, mode="window"),
+    "citadel": dict(_FILING_WINDOW, mode="window"),
+}
+
+
+def retention_seconds(collection_key):
+    return RETENTION_POLICIES[collection_key]["days"] * 24 * 3600
+
+
+def is_timeseries(collection_key):
+
+    # Only collections with a time-series policy can be one
+    if not RETENTION_POLICIES.get(collection_key, {}).get("timeseries"):
+        return False
+    collection_name = MONGO_COLLECTIONS.get(collection_key)
+    try:
+        for info in get_db().list_collections(filter={"name": collection_name}):
+            return info.get("type") == "timeseries"
+    except PyMongoError as e:
+        logger.error(red + f"Could not inspect {collection_key}: {e}" + reset)
+    return False
+
+
+def ensure_retention_collections():
+
+    # Time-series collections can only be created, not converted. Runs before
+    # ensure_indexes, which would otherwise create a regular collection first.
+    db = get_db()
+    existing = set(db.list_collection_names())
+    for collection_key, policy in RETENTION_POLICIES.items():
+        if not policy.get("timeseries"):
+            continue
+        collection_name = MONGO_COLLECTIONS.get(collection_key)
+        expire = retention_seconds(collection_key)
+        try:
+            if collection_name not in existing:
+                db.create_collection(
+                    collection_name,
+                    timeseries=policy["timeseries"],
+                    expireAfterSeconds=expire,
+                )
+                logger.info(
+                    green + f"Created time-series collection {collection_key}" + reset
+                )
+            elif is_timeseries(collection_key):
+                db.command("collMod", collection_name, expireAfterSeconds=expire)
+            else:
+                logger.warning(
+                    blue
+                    + f"{collection_key} is a regular collection, using a TTL index"
+                    + reset
+                )
+        except (CollectionInvalid, PyMongoError) as e:
+            logger.error(
+                red + f"Failed to set up retention for {collection_key}: {e}" + reset
+            )
+
+
+def _storage(collection_key):
+    collection_name = MONGO_COLLECTIONS.get(collection_key)
+    try:
+        stats = get_db().command("collStats", collection_name)
+        return {
+            "documents": stats.get("count", 0),
+            "storage_bytes": stats.get("storageSize", 0),
+            "index_bytes": stats.get("totalIndexSize", 0),
+        }
+    except PyMongoError:
+        return {}
+
+
+def _ttl_expired(collection_key, field, now):
+
+    # The TTL monitor only reports a server-wide total. Per collection, what it
+    # removed since the last pass is the count then, plus what was written
+    # since, minus the count now. Both counts stop at `now`. The first pass
+    # only records the count and reports 0.
+    collection = get_collection(collection_key)
+    ledger_key = RETENTION_LEDGER_PREFIX + collection_key
+    current = collection.count_documents({field: {"$lt": now}})
+    expired = 0
+    try:
+        client = get_redis_client("default")
+        previous = client.hgetall(ledger_key)
+        if previous:
+            since = datetime.fromisoformat(previous["at"])
+            written = collection.count_documents({field: {"$gte": since, "$lt": now}})
+            expired = max(int(previous["count"]) + written - current, 0)
+        client.hset(ledger_key, mapping={"count": current, "at": now.isoformat()})
+    except (RedisError, KeyError, ValueError) as e:
+        logger.error(
+            red + f"Retention ledger unavailable for {collection_key}: {e}" + reset
+        )
+    return expired
+
+
+def enforce_retention(now=None):
+
+    now = now or datetime.now()
+    report = {}
+    for collection_key, policy in RETENTION_POLICIES.items():
+        cutoff = now - timedelta(days=policy["days"])
+        if policy["mode"] == "ttl":
+            # expireAfterSeconds does the deleting, and time-series collections
+            # before Mongo 7.0 refuse deletes that filter on the time field
+            try:
+                expired = _ttl_expired(collection_key, policy["field"], now)
+            except PyMongoError as e:
+                logger.error(red + f"Could not count {collection_key}: {e}" + reset)
+                expired = 0
+            report[collection_key] = dict(
+                mode="ttl",
+                cutoff=cutoff.isoformat(),
+                expired=expired,
+                **_storage(collection_key),
+            )
+            logger.info(
+                green
+                + f"Retention {collection_key}: {expired} document(s) expired by TTL"
+                + reset
+            )
+            continue
+        deleted = delete_documents(
+            collection_key, {policy["field"]: {"$lt": cutoff}}, multiple=True
+        )
+        report[collection_key] = dict(
+            mode=policy["mode"],
+            cutoff=cutoff.isoformat(),
+            expired=deleted,
+            **_storage(collection_key),
+        )
+        logger.info(
+            green
+            + f"Retention {collection_key}: {deleted} document(s) older than "
+            + f"{cutoff:%Y-%m-%d} removed"
+            + reset
+        )
+
+    # What Mongo's TTL monitor removed on its own (server-wide, since startup)
+    try:
+        ttl = get_db().command("serverStatus")["metrics"]["ttl"]
+        report["ttl_monitor"] = {
+            "deleted_documents": ttl.get("deletedDocuments", 0),
+            "passes": ttl.get("passes", 0),
+        }
+    except (PyMongoError, KeyError):
+        pass
+    return report
@@ -0,0 +1,178 @@
+# Response snapshots for the read API (web/data.py). A page is serialised to
+# JSON once per collection version and query shape, compressed once per
+# encoding and kept in a Redis hash next to its ETag. Any write bumps the
+# version, so a snapshot never needs invalidating, it is just no longer asked for.
+import os
+import gzip
+import json
+import hashlib
+import logging
+import time
+import decimal
+from datetime import datetime, date
+from bson import ObjectId, Decimal128
+from connection.connect_redis import get_cache_redis_client
+from db.redis_operations import (
+    acquire_cache_lock,
+    release_cache_lock,
+    get_collection_version,
+    query_shape_digest,
+)
+from utils.helpers import green, red, reset
+
+# Optional dependency, gzip only when it is not installed.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "snapshot:"
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", 3600))
+# Compressed once and served many times, so the slower, smaller settings pay off
+SNAPSHOT_GZIP_LEVEL = int(os.getenv("SNAPSHOT_GZIP_LEVEL", 9))
+SNAPSHOT_BROTLI_QUALITY = int(os.getenv("SNAPSHOT_BROTLI_QUALITY", 11))
+# Bodies below this are only stored as identity
+SNAPSHOT_COMPRESS_MIN_BYTES = int(os.getenv("SNAPSHOT_COMPRESS_MIN_BYTES", 1024))
+# One request builds a missing snapshot, the others wait this long for it
+SNAPSHOT_LOCK_MS = int(os.getenv("SNAPSHOT_LOCK_MS", 5000))
+SNAPSHOT_WAIT_MS = int(os.getenv("SNAPSHOT_WAIT_MS", 2000))
+
+
+def available_encodings():
+    # Most preferred first
+    return (["br"] if brotli is not None else []) + ["gzip", "identity"]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (ObjectId, Decimal128, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Not JSON serialisable: {type(value).__name__}")
+
+
+def build_snapshot(payload):
+
+    # {etag, identity, gzip, br}: the ETag is strong (a digest of the bytes),
+    # each encoding gets its own suffix as the bytes on the wire differ.
+    body = json.dumps(payload, default=_json_default, separators=(",", ":"))
+    body = body.encode()
+    snapshot = {
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "identity": body,
+    }
+    if len(body) >= SNAPSHOT_COMPRESS_MIN_BYTES:
+        snapshot["gzip"] = gzip.compress(body, SNAPSHOT_GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            snapshot["br"] = brotli.compress(body, quality=SNAPSHOT_BROTLI_QUALITY)
+    return snapshot
+
+
+def etag_for(etag, encoding):
+    # Unquoted, as werkzeug's set_etag / if_none_match expect
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+
+def snapshot_key(collection_key, version, digest):
+    return f"{SNAPSHOT_PREFIX}{collection_key}:v{version}:{digest}"
+
+
+def snapshot_etag(collection_key, shape):
+
+    # ETag of the current snapshot, or None. Redis only: this is what lets an
+    # unchanged page answer 304 without reading Mongo.
+    version = get_collection_version(collection_key)
+    if version is None:
+        return None
+    key = snapshot_key(collection_key, version, query_shape_digest(**shape))
+    try:
+        etag = get_cache_redis_client().hget(key, "etag")
+        return etag.decode() if isinstance(etag, bytes) else etag
+    except Exception as e:
+        logger.error(red + f"Failed to read snapshot ETag for {key}: {e}" + reset)
+        return None
+
+
+def _read(key, encodings):
+    # (etag, encoding, body) for the first stored encoding in the list
+    etag, *bodies = get_cache_redis_client().hmget(key, ["etag", *encodings])
+    if etag is None:
+        return None
+    for encoding, body in zip(encodings, bodies):
+        if body is not None:
+            return etag.decode(), encoding, body
+    return None
+
+
+def _store(key, snapshot):
+    pipe = get_cache_redis_client().pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(key, mapping=snapshot)
+    pipe.expire(key, SNAPSHOT_TTL)
+    pipe.execute()
+
+
+def _pick(snapshot, encodings):
+    for encoding in encodings:
+        if encoding in snapshot:
+            return snapshot["etag"], encoding, snapshot[encoding]
+    return snapshot["etag"], "identity", snapshot["identity"]
+
+
+def get_snapshot(collection_key, shape, build, encodings):
+
+    # Returns (etag, encoding, body). shape is the find() arguments the page
+    # is built from (query, sort_by, limit, projection), build() returns the
+    # payload. encodings lists what the client accepts, preferred first, and
+    # always ends in identity.
+    version = get_collection_version(collection_key)
+    if version is None:
+        # Redis down: serve straight from Mongo, nothing is stored
+        return _pick(build_snapshot(build()), encodings)
+
+    key = snapshot_key(collection_key, version, query_shape_digest(**shape))
+    try:
+        found = _read(key, encodings)
+    except Exception as e:
+        logger.error(red + f"Snapshot cache unavailable for {key}: {e}" + reset)
+        return _pick(build_snapshot(build()), encodings)
+    if found:
+        return found
+
+    # Token lock, released by compare-and-delete: a build that outlives
+    # SNAPSHOT_LOCK_MS cannot release the lock of the next builder
+    token = acquire_cache_lock(key, SNAPSHOT_LOCK_MS)
+    if not token:
+        # Another request is building this snapshot
+        deadline = time.monotonic() + SNAPSHOT_WAIT_MS / 1000
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                found = _read(key, encodings)
+            except Exception:
+                break
+            if found:
+                return found
+
+    try:
+        snapshot = build_snapshot(build())
+        try:
+            _store(key, snapshot)
+            logger.info(
+                green
+                + f"Snapshot built for {key}: {len(snapshot['identity'])} bytes"
+                + reset
+            )
+        except Exception as e:
+            logger.error(red + f"Failed to store snapshot {key}: {e}" + reset)
+    finally:
+        if token:
+            release_cache_lock(key, token)
+    return _pick(snapshot, encodings)
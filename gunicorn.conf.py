@@ -0,0 +1,51 @@
+# Production serving profile: gunicorn -c gunicorn.conf.py
+# gthread workers: a few processes, each with a thread pool sharing that
+# process' Mongo/Redis pools. 2FA, reset and data requests mostly wait on
+# I/O, so threads keep concurrency up without one pool set per request.
+import os
+
+wsgi_app = "web:create_app()"
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5000")
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", (os.cpu_count() or 1) + 1))
+# Stay below the smallest Redis pool (REDIS_SESSION_MAX_CONNECTIONS, 20)
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then, jitter so they do not all restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = 500
+# The app is loaded in each worker, every process builds its own clients
+preload_app = False
+accesslog = "-"
+
+# bcrypt threads per worker; workers x HASH_WORKERS should not exceed the cores
+os.environ.setdefault("HASH_WORKERS", "2")
+
+
+def on_starting(server):
+    # Once, in the master, before any worker exists
+    from db.indexes import ensure_indexes
+
+    try:
+        ensure_indexes()
+    except Exception as e:
+        server.log.error(f"Failed to ensure indexes on boot: {e}")
+
+
+def post_worker_init(worker):
+    # App loaded in this worker: open pools and fill caches before it serves
+    from web.warmup import warm_up
+
+    warm_up()
+
+
+def worker_exit(server, worker):
+    from db.audit import shutdown_audit_writer
+    from utils.hashing import shutdown_hashing_pool
+    from utils.metrics import flush_metrics
+
+    shutdown_audit_writer()
+    shutdown_hashing_pool()
+    flush_metrics()
@@ -1,18 +1,19 @@
-import bcrypt, requests
 from utils.session import create_jwt
 from utils.auth import input_masking
-from db.db_operations import find_documents
+from db.db_operations import find_documents, update_documents
+from utils.hashing import verify_and_upgrade, HashingBusy
 from db.audit import log_audit_event
-from connection.connect_redis import redis_client
+from utils.rate_limit import hit, reset_limit
+from utils.two_factor import issue_code, verify_code
 from login.user_menu import (
     admin_menu,
 )  # Change for the program its part of boilerplate
 from utils.sendmail import send_email
 from utils.auth import (
-    get_system_info,
+    get_fingerprint,
+    fingerprint_known,
     sha256_encrypt,
     lock_account,
-    normalize_system_info,
 )
 from utils.helpers import (
     input_quit_handle,
@@ -54,24 +55,39 @@ def login():
         clear()
         return
 
-    attempts = redis_client.incr(f"rate_limit:login:{hashed_name}")
-    if attempts == 1:
-        redis_client.expire(f"rate_limit:login:{hashed_name}", 300)
-
-    if attempts > 5:  # Allow up to 5 attempts
-        typing_effect(red + "Too many login attempts! Please try again later." + reset)
+    limit = hit("login", hashed_name)  # Up to 5 attempts per 5 minutes
+    if not limit["allowed"]:
+        typing_effect(
+            red
+            + "Too many login attempts! "
+            + f"Please try again in {int(limit['retry_after']) + 1} seconds."
+            + reset
+        )
         sleep()
         clear()
         return
 
     # Verify password here (for rate limiter +=)
-    if not bcrypt.checkpw(password.encode(), admin["password"].encode()):
+    try:
+        valid, upgraded_hash = verify_and_upgrade(password, admin["password"])
+    except HashingBusy:
+        typing_effect(red + "Server busy, please try again in a moment." + reset)
+        sleep()
+        clear()
+        return
+    if not valid:
         typing_effect(red + "Incorrect password! Your account is locked." + reset)
         lock_account(admin)
         return
 
+    # Stored with an older, cheaper cost: replace it now the password is known
+    if upgraded_hash:
+        update_documents(
+            "admin", {"_id": admin["_id"]}, {"$set": {"password": upgraded_hash}}
+        )
+
     # Reset rate limit (If login succ6)
-    redis_client.delete(f"rate_limit:login:{hashed_name}")
+    reset_limit("login", hashed_name)
 
     token = create_jwt(str(admin["_id"]), admin["email"])
 
@@ -86,16 +102,8 @@ def login():
         typing_effect(red + "Login process terminated due to 2FA failure." + reset)
         return
 
-    system_info = get_system_info()
-    system_log = find_documents("admin_log", {})
-    system_log = [
-        {key: value for key, value in log.items() if key != "_id"} for log in system_log
-    ]  # Remove the _id field if present
-
-    normalized_system_info = normalize_system_info(system_info)
-    normalized_system_log = normalize_system_info(system_log)
-
-    if normalized_system_info not in normalized_system_log:
+    system_info, digest = get_fingerprint()
+    if not fingerprint_known(digest, system_info):
         typing_effect(red + "System info mismatch! Your account is locked." + reset)
         lock_account(admin)
         return
@@ -110,47 +118,28 @@ def login():
 def handle_2fa(admin, token):
 
     if admin.get("2fa_method") is True:
+        user_id = str(admin["_id"])
         typing_effect(blue + "Sending 2FA code to your email..." + reset)
-        try:
-            response = requests.post(
-                "http://127.0.0.1:5000/send-2fa", json={"email": admin["email"]}
-            )
-            response.raise_for_status()
-            expected_code = response.json().get("code")
-            if not expected_code:
-                typing_effect(red + "Failed to retrieve 2FA code from server." + reset)
-                return False
-        except requests.RequestException as e:
-            typing_effect(
-                red + f"Error sending 2FA code: {str(e)}. Login denied." + reset
-            )
+        if not issue_code(user_id, admin["email"]):
+            typing_effect(red + "Error sending 2FA code. Login denied." + reset)
             return False
 
-        # Retrieve expected 2FA code
-        expected_code = response.json().get("code")
-        if not expected_code:
-            typing_effect(red + "Failed to retrieve 2FA code from server." + reset)
-            return False
-
-        # Prompt admin for 2FA code
-        code = input_quit_handle("Enter the 2FA code sent to your email: ").strip()
-        try:
-            verification_response = requests.post(
-                "http://127.0.0.1:5000/verify-2fa",
-                json={"code": code, "expected_code": expected_code, "token": token},
-            )
-            verification_response.raise_for_status()
-            if verification_response.json().get("success"):
+        # Prompt admin for 2FA code, a wrong code may be retried while the
+        # attempt budget lasts
+        while True:
+            code = input_quit_handle("Enter the 2FA code sent to your email: ").strip()
+            result = verify_code(user_id, code, email=admin["email"])
+            if result["success"]:
                 print(green + "2FA verification successful!" + reset)
                 return True
-            else:
-                typing_effect(red + "Invalid 2FA code. Login denied." + reset)
+            if not result["attempts_left"]:
+                typing_effect(red + f"{result['message']}. Login denied." + reset)
                 return False
-        except requests.RequestException as e:
             typing_effect(
-                red + f"2FA verification failed: {str(e)}. Login denied." + reset
+                red
+                + f"{result['message']}, {result['attempts_left']} attempt(s) left."
+                + reset
             )
-            return False
     else:
         typing_effect(blue + "2FA is not enabled for this account." + reset)
         sleep()
@@ -1,8 +1,9 @@
-import os, bcrypt
+import os
 from utils.auth import input_masking
 from db.audit import log_audit_event
 from itsdangerous import URLSafeTimedSerializer
-from connection.connect_redis import redis_client
+from utils.rate_limit import hit
+from utils.hashing import hash_password
 from db.db_operations import find_documents, update_documents
 from utils.sendmail import send_email
 from utils.helpers import (
@@ -58,8 +59,8 @@ def reset_password(token, new_password):
     if not email:
         return {"success": False, "message": "Invalid or expired token"}
 
-    hashed_password = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
     try:
+        hashed_password = hash_password(new_password)
         update_documents(
             "admin", {"email": email}, {"$set": {"password": hashed_password}}
         )
@@ -74,20 +75,13 @@ def reset_terminal():
     email = input_quit_handle(green + "Enter your email: ")
     # May add prompt for secoundair password here:
 
-    rate_limit_key = f"rate_limit:reset:{email}"
-    if redis_client.get(rate_limit_key):
-        typing_effect(red + "Too many attempts. Please try again later." + reset)
-        sleep()
-        clear()
-        return
-
-    attempts = redis_client.incr(rate_limit_key)
-    if attempts == 1:
-        redis_client.expire(rate_limit_key, 300)
-
-    if attempts > 5:
+    limit = hit("reset", email)
+    if not limit["allowed"]:
         typing_effect(
-            red + "Too many attempts. Please try again after 5 minutes." + reset
+            red
+            + "Too many attempts. "
+            + f"Please try again in {int(limit['retry_after']) + 1} seconds."
+            + reset
         )
         sleep()
         clear()
@@ -1,7 +1,7 @@
 import os
 from db.audit import log_audit_event
 from itsdangerous import URLSafeTimedSerializer
-from connection.connect_redis import redis_client
+from utils.rate_limit import hit
 from db.db_operations import find_documents, update_documents
 from utils.sendmail import send_email
 from utils.helpers import (
@@ -72,20 +72,13 @@ def unlock_terminal():
 
     email = input_quit_handle("Enter the email to unlock: ")
 
-    rate_limit_key = f"rate_limit:unlock:{email}"
-    if redis_client.get(rate_limit_key):
-        typing_effect(red + "Too many attempts. Please try again later." + reset)
-        sleep()
-        return
-
-    # Increment attempts
-    attempts = redis_client.incr(rate_limit_key)
-    if attempts == 1:
-        redis_client.expire(rate_limit_key, 300)
-
-    if attempts > 5:
+    limit = hit("unlock", email)
+    if not limit["allowed"]:
         typing_effect(
-            red + "Too many attempts. Please try again after 5 minutes." + reset
+            red
+            + "Too many attempts. "
+            + f"Please try again in {int(limit['retry_after']) + 1} seconds."
+            + reset
         )
         sleep()
         return
@@ -3,7 +3,8 @@
 import json
 from pathlib import Path
 from utils.helpers import green, red, blue, reset
-from db.db_operations import insert_document
+from db.indexes import ensure_indexes
+from db.db_operations import bulk_insert_documents
 from connection.connect_db import MONGO_COLLECTIONS
 
 DATA_FOLDER = Path("./data")
@@ -29,13 +30,21 @@ def seed_collection(collection_key: str, data: list):
     if not data:
         print(blue + f"No data to seed for collection: {collection_key}" + reset)
         return
-    for document in data:
-        insert_document(collection_key, document)
-    print(green + f"Seeded {len(data)} document(s) into {collection_key}" + reset)
+    results = bulk_insert_documents(collection_key, data)
+    inserted = sum(batch["inserted"] for batch in results)
+    errors = sum(len(batch["errors"]) for batch in results)
+    if errors:
+        print(
+            red + f"{errors} document(s) failed to seed into {collection_key}" + reset
+        )
+    print(green + f"Seeded {inserted} document(s) into {collection_key}" + reset)
 
 
 def main():
 
+    # Indexes first, unique indexes also guard the seed data.
+    ensure_indexes()
+
     for collection_key in MONGO_COLLECTIONS.keys():
         json_file = DATA_FOLDER / f"{collection_key}.json"
 
@@ -2,7 +2,7 @@
 
 import json
 from pathlib import Path
-from utils.auth import sha256_encrypt, bcrypt_hash, get_system_info  # store_log
+from utils.auth import sha256_encrypt, bcrypt_hash, get_fingerprint  # store_log
 from utils.helpers import green, red, blue, reset, typing_effect, input_quit_handle
 
 # Paths for storing data:
@@ -54,7 +54,8 @@ def create_admin():
         "2fa_method": True,
     }
 
-    system_info = get_system_info()
+    system_info, digest = get_fingerprint()
+    system_info["fingerprint_digest"] = digest  # Matched on login
 
     with open(ADMIN_JSON, "w") as admin_file:
         json.dump(encrypted_admin_data, admin_file, indent=4)
@@ -79,7 +80,7 @@ if __name__ == "__main__":
             create_admin()
 
             print(blue + "Gathering and encrypting system information..." + reset)
-            system_info = get_system_info()
+            system_info, _ = get_fingerprint()
 
             log_file_path = Path("./data/admin_log.json")
             # store_log(system_info, log_file_path)   # Use if you want to encrypt every peace of data in the DB (not recommended due to email sevice)
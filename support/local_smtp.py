@@ -0,0 +1,65 @@
+# Local SMTP stand-in for development and testing the mail queue.
+# Needs aiosmtpd (pip install aiosmtpd). Run from the root folder:
+#   python -m support.local_smtp [port]
+# and point the app at it: SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_SECURITY=plain
+
+import sys
+import time
+from email import message_from_bytes
+from utils.helpers import green, blue, red, reset
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class PrintingHandler:
+
+    # Keeps every message in memory and prints a one-line summary
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        message = message_from_bytes(envelope.content)
+        self.messages.append(
+            {
+                "from": envelope.mail_from,
+                "to": list(envelope.rcpt_tos),
+                "subject": message["Subject"],
+            }
+        )
+        print(
+            blue
+            + f"Mail from {envelope.mail_from} to {', '.join(envelope.rcpt_tos)}: "
+            + f"{message['Subject']}"
+            + reset
+        )
+        return "250 Message accepted for delivery"
+
+
+def start_local_smtp(port=1025, host="127.0.0.1"):
+
+    # Returns (controller, handler); controller.stop() shuts it down
+    if Controller is None:
+        raise RuntimeError("aiosmtpd is not installed: pip install aiosmtpd")
+    handler = PrintingHandler()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    return controller, handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 1025
+    try:
+        controller, _ = start_local_smtp(port)
+    except RuntimeError as e:
+        print(red + str(e) + reset)
+        sys.exit(1)
+    print(green + f"Local SMTP listening on 127.0.0.1:{port} (Ctrl+C to stop)" + reset)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        controller.stop()
@@ -1,8 +1,77 @@
 from datetime import datetime
+from celery.signals import (
+    worker_init,
+    worker_ready,
+    worker_process_shutdown,
+    task_prerun,
+    task_postrun,
+)
 from celery_app import celery, logger
 from utils.helpers import red, green, reset
+from db.indexes import ensure_indexes
+from db.audit import shutdown_audit_writer
+from db.retention import enforce_retention
+from utils.sendmail import deliver, close_smtp_connection
+from utils.auth import backfill_fingerprint_digests
+from utils.two_factor import send_code
+from utils.metrics import begin_scope, end_scope, flush_metrics
 from db.db_operations import insert_document
+from db.snapshots import SNAPSHOT_PREFIX
+from db.redis_operations import (
+    QUERY_VERSION_PREFIX,
+    QUERY_CACHE_PREFIX,
+    DOC_CACHE_PREFIX,
+    get_collection_version,
+    refresh_entry,
+    finish_refresh,
+    sweep_keys,
+)
 from connection.connect_redis import get_redis_client
+from connection.connect_db import MONGO_COLLECTIONS
+
+
+@worker_init.connect
+def ensure_indexes_on_boot(**kwargs):
+    try:
+        ensure_indexes()
+    except Exception as e:
+        logger.error(red + f"Failed to ensure indexes on worker boot: {e}" + reset)
+
+
+@worker_ready.connect
+def backfill_fingerprints_on_boot(**kwargs):
+    # One-off, queued rather than run here so the worker starts consuming
+    # right away. Once done it is a single indexed query.
+    backfill_fingerprints.delay()
+
+
+@worker_process_shutdown.connect
+def flush_audit_on_shutdown(**kwargs):
+    # Pool children may exit without running atexit handlers
+    shutdown_audit_writer()
+    close_smtp_connection()
+    flush_metrics()
+
+
+# Open metric scopes by task id, prerun/postrun run on the task's thread
+_task_scopes = {}
+
+
+@task_prerun.connect
+def start_task_metrics(task_id=None, **kwargs):
+    _task_scopes[task_id] = begin_scope()
+
+
+@task_postrun.connect
+def record_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    scope = _task_scopes.pop(task_id, None)
+    if scope is not None:
+        end_scope(
+            scope,
+            "celery_task_duration_seconds",
+            {"task": task.name if task else "?", "state": state or "UNKNOWN"},
+            f"task {task.name if task else task_id}",
+        )
 
 
 @celery.task
@@ -21,36 +90,157 @@ def check_and_update_30f():
         logger.error(red + f"Error updating 30F filings: {e}" + reset)
 
 
+# Retry delay doubles per attempt: 10s, 20s, 40s, ... capped at 10 minutes
+MAIL_MAX_RETRIES = 6
+MAIL_RETRY_BASE = 10
+MAIL_RETRY_MAX = 600
+
+
+@celery.task(
+    bind=True, max_retries=MAIL_MAX_RETRIES, acks_late=True, ignore_result=True
+)
+def send_mail(self, messages):
+    try:
+        failed = deliver(messages)
+    except Exception as e:
+        logger.error(red + f"Error sending email: {e}" + reset)
+        failed = messages
+    if not failed:
+        return len(messages)
+
+    if self.request.retries >= MAIL_MAX_RETRIES:
+        logger.error(red + f"Giving up on {len(failed)} email(s)" + reset)
+        return len(messages) - len(failed)
+    # Only what failed goes back on the queue
+    countdown = min(MAIL_RETRY_BASE * 2**self.request.retries, MAIL_RETRY_MAX)
+    raise self.retry(args=[failed], countdown=countdown)
+
+
+@celery.task(ignore_result=True)
+def send_2fa_code(user_id, email):
+    # Generated here rather than by the caller, so the plain code is never
+    # part of a message sitting in the broker
+    send_code(user_id, email)
+
+
+@celery.task
+def backfill_fingerprints():
+    try:
+        updated = backfill_fingerprint_digests()
+        logger.info(
+            green + f"Fingerprint digest added to {updated} admin_log entries" + reset
+        )
+        return updated
+    except Exception as e:
+        logger.error(red + f"Error backfilling fingerprint digests: {e}" + reset)
+
+
+@celery.task(ignore_result=True)
+def refresh_cache_entry(name, key, args, soft_ttl, hard_ttl, version=None):
+    try:
+        refresh_entry(name, key, args, soft_ttl, hard_ttl, version)
+    except Exception as e:
+        logger.error(red + f"Error refreshing cache entry {key}: {e}" + reset)
+    finally:
+        finish_refresh(key)
+
+
+# Keys clean_redis_cache looks at, anything else in the DB (sessions,
+# counters, other apps) is left alone. Every cache writer sets a TTL, so what
+# is worth removing early is what can no longer be read:
+# - query_version:<collection> for collections no longer configured, these
+#   counters have no TTL and would stay forever;
+# - query:/doc:/snapshot:<collection>:v<N>:... entries whose version has been
+#   superseded by a write, held in memory until their TTL (up to an hour).
+# swr:, lock: and refresh: keys are short-lived and not versioned by name.
+# The weekly run mostly catches the first case; trigger it after a bulk load
+# (POST /trigger-maintenance, "clean_cache") to free the second early.
+VERSIONED_CACHE_PREFIXES = (QUERY_CACHE_PREFIX, DOC_CACHE_PREFIX, SNAPSHOT_PREFIX)
+
+
+def _orphaned_cache_key(name, versions):
+
+    if name.startswith(QUERY_VERSION_PREFIX):
+        return name[len(QUERY_VERSION_PREFIX) :] not in MONGO_COLLECTIONS
+    parts = name.split(":", 3)
+    if len(parts) < 4 or parts[2][:1] != "v" or not parts[2][1:].isdigit():
+        return False
+    current = versions.get(parts[1])
+    return current is not None and int(parts[2][1:]) < current
+
+
+@celery.task
+def apply_retention():
+    try:
+        report = enforce_retention()
+        expired = sum(
+            result.get("expired", 0)
+            for key, result in report.items()
+            if key != "ttl_monitor"
+        )
+        logger.info(green + f"Retention pass expired {expired} document(s)" + reset)
+        return report
+    except Exception as e:
+        logger.error(red + f"Error applying retention: {e}" + reset)
+
+
 @celery.task
 def clean_redis_cache():
-    redis_client = get_redis_client()
+    redis_client = get_redis_client("cache")
     try:
-        keys = redis_client.keys("*")
-        for key in keys:
-            if key.startswith("celery-task-meta-") or key.startswith("_kombu.binding."):
-                continue  # Skip Celery-related keys
-            ttl = redis_client.ttl(key)
-            if ttl == -1:  # Keys with no expiration
-                redis_client.delete(key)
-        logger.info(green + "Redis cache cleaned successfully." + reset)
+        # Read once per run: a version bumped meanwhile only spares a few
+        # entries until the next run, it never removes a current one
+        versions = {}
+        for collection_key in MONGO_COLLECTIONS:
+            version = get_collection_version(collection_key)
+            if version is not None:
+                versions[collection_key] = version
+        report = sweep_keys(
+            redis_client,
+            "clean_redis_cache",
+            only_prefixes=(QUERY_VERSION_PREFIX, *VERSIONED_CACHE_PREFIXES),
+            select=lambda name: _orphaned_cache_key(name, versions),
+        )
+        logger.info(
+            green
+            + f"Redis cache cleaned: scanned {report['scanned']}, deleted "
+            + f"{report['deleted']} in {report['elapsed']}s "
+            + (
+                "(complete)"
+                if report["complete"]
+                else f"(resume at {report['cursor']})"
+            )
+            + reset
+        )
+        return report
     except Exception as e:
         logger.error(red + f"Error during Redis cache cleanup: {e}" + reset)
 
 
 @celery.task
 def clean_celery_metadata():
-    redis_client = get_redis_client()
     try:
-        # Clean Celery metadata keys
-        keys = redis_client.keys("celery-task-meta-*")
-        for key in keys:
-            redis_client.delete(key)
-
-        # Clean Kombu bindings
-        keys = redis_client.keys("_kombu.binding.*")
-        for key in keys:
-            redis_client.delete(key)
-
-        logger.info(green + f"Cleared Celery task metadata and routing keys.{reset}")
+        reports = {
+            # Clean Celery metadata keys (result backend)
+            "task_meta": sweep_keys(
+                get_redis_client("backend"),
+                "clean_celery_metadata:meta",
+                match="celery-task-meta-*",
+            ),
+            # Clean Kombu bindings (broker)
+            "bindings": sweep_keys(
+                get_redis_client("broker"),
+                "clean_celery_metadata:bindings",
+                match="_kombu.binding.*",
+            ),
+        }
+        for name, report in reports.items():
+            logger.info(
+                green
+                + f"Celery {name}: scanned {report['scanned']}, deleted "
+                + f"{report['deleted']} in {report['elapsed']}s"
+                + reset
+            )
+        return reports
     except Exception as e:
         logger.error(red + f"Failed to clear Celery metadata keys: {e}{reset}")
@@ -2,19 +2,23 @@
 import re
 import json
 import hashlib
-import bcrypt
-import requests
 import platform
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 # from pathlib import Path
 from colorama import Style
-import os, re, time, getpass, msvcrt
-from models.all_models import RegisterModel
-from db.db_operations import find_documents, update_documents
-from pydantic import ValidationError, BaseModel
+import os, re, time, getpass
+from db.db_operations import (
+    find_documents,
+    insert_document,
+    update_documents,
+    iter_documents,
+)
 from utils.helpers import red, blue, reset, input_quit_handle
 from utils.sendmail import send_email
+from utils.hashing import hash_password
 
 
 def input_masking(prompt, delay=0.02, typing_effect=False, color=None):
@@ -39,6 +43,8 @@ def input_masking(prompt, delay=0.02, typing_effect=False, color=None):
 
     # For Windows input masking.
     if os.name == "nt":
+        import msvcrt  # Windows only
+
         while True:
             char = msvcrt.getch()  # Get a single character from the user.
 
@@ -68,121 +74,143 @@ def input_masking(prompt, delay=0.02, typing_effect=False, color=None):
     return user_input
 
 
-def get_system_info():
+# Fingerprint probes run concurrently and the result is cached per process.
+FINGERPRINT_TTL = int(os.getenv("FINGERPRINT_TTL", 300))
+FINGERPRINT_LOCATION_TIMEOUT = float(os.getenv("FINGERPRINT_LOCATION_TIMEOUT", 5))
+
+_MAC = re.compile(r"(?:[0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}")
+_NO_MAC = {"00:00:00:00:00:00", "ff:ff:ff:ff:ff:ff"}
+_VIRTUAL_BLOCK = ("loop", "ram", "zram", "dm-", "md", "sr")
+
+_fingerprint = {"at": 0.0, "info": None, "digest": None}
+_fingerprint_lock = threading.Lock()
+
+
+def _read_sysfs(path):
     try:
-        # MAC Addresses
-        mac_addresses = []
-        try:
-            if platform.system() == "Windows":
-                # Windows: Get MAC addresses using PowerShell
-                command = (
-                    'powershell -Command "Get-NetAdapter | '
-                    'Select-Object -ExpandProperty MacAddress"'
-                )
-                output = subprocess.check_output(command, shell=True).decode().strip()
-                mac_addresses = [
-                    mac.replace("-", ":").strip() for mac in output.splitlines() if mac
-                ]
-            else:
-                # Linux/Mac: Get MAC addresses using ip link or ifconfig
-                try:
-                    output = subprocess.check_output("ip link", shell=True).decode()
-                    mac_matches = re.findall(
-                        r"([0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}", output
-                    )
-                    mac_addresses = list(set(mac_matches))
-                except Exception:
-                    output = subprocess.check_output("ifconfig", shell=True).decode()
-                    mac_matches = re.findall(
-                        r"([0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}", output
-                    )
-                    mac_addresses = list(set(mac_matches))
-            mac_addresses = list(filter(None, mac_addresses))  # Remove empty entries
-        except Exception as e:
-            print(f"Error fetching MAC addresses: {e}")
-
-        # Drives (HDD/SSD Serial Numbers)
-        drives = []
-        try:
-            if platform.system() == "Windows":
-                # Windows: Get drives using PowerShell
-                command = (
-                    'powershell -Command "Get-WmiObject Win32_DiskDrive | '
-                    'Select-Object Model, SerialNumber"'
-                )
-                output = subprocess.check_output(command, shell=True).decode().strip()
-                for line in output.splitlines()[3:]:
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        model = " ".join(parts[:-1])
-                        serial = parts[-1]
-                        drives.append({"model": model, "serial": serial})
-            else:
-                # Linux: Get drives using lsblk
-                output = subprocess.check_output(
-                    "lsblk -o NAME,SERIAL", shell=True
-                ).decode()
-                for line in output.splitlines()[1:]:
-                    if line.strip():
-                        parts = line.split()
-                        if len(parts) == 2:
-                            drives.append({"model": parts[0], "serial": parts[1]})
-        except Exception as e:
-            print(f"Error fetching HDD/SSD serial numbers: {e}")
-
-        # Motherboard Serial Number
-        motherboard_serial = "Unknown"
-        try:
-            if platform.system() == "Windows":
-                # Windows: Get motherboard serial using PowerShell
-                motherboard_serial = (
-                    subprocess.check_output(
-                        'powershell -Command "(Get-WmiObject Win32_BaseBoard).SerialNumber"',
-                        shell=True,
-                    )
-                    .decode()
-                    .strip()
-                )
-            else:
-                # Linux: Read from system files
-                motherboard_serial = (
-                    subprocess.check_output(
-                        "cat /sys/class/dmi/id/board_serial", shell=True
-                    )
-                    .decode()
-                    .strip()
-                )
-        except Exception as e:
-            print(f"Error fetching motherboard serial: {e}")
-
-        # Location (Latitude and Longitude)
-        latitude, longitude = "Unknown", "Unknown"
-        try:
-            response = requests.get("https://ipinfo.io/json", timeout=5)
-            if response.status_code == 200:
-                location = response.json().get("loc", "Unknown")
-                if location != "Unknown":
-                    latitude, longitude = location.split(",")
-        except Exception as e:
-            print(f"Error fetching location: {e}")
-
-        # Return System Info
-        return {
-            "mac_addresses": mac_addresses,
-            "drives": drives,
-            "motherboard_serial": motherboard_serial,
-            "latitude": latitude,
-            "longitude": longitude,
-        }
-    except Exception as e:
-        print(f"Error fetching system info: {e}")
-        return {
-            "mac_addresses": [],
-            "drives": [],
-            "motherboard_serial": "Unknown",
-            "latitude": "Unknown",
-            "longitude": "Unknown",
-        }
+        with open(path, "rb") as file:
+            raw = file.read()
+    except OSError:  # Missing, or root-only like board_serial
+        return ""
+    # vpd pages are binary, keep the printable part
+    return "".join(ch for ch in raw.decode(errors="ignore") if ch.isprintable()).strip()
+
+
+def _powershell(command):
+    return subprocess.check_output(
+        ["powershell", "-Command", command], timeout=10
+    ).decode()
+
+
+def _probe_mac_addresses():
+
+    if platform.system() == "Windows":
+        output = _powershell(
+            "Get-NetAdapter | Select-Object -ExpandProperty MacAddress"
+        )
+        macs = [mac.replace("-", ":").strip() for mac in output.splitlines()]
+    elif os.path.isdir("/sys/class/net"):
+        # Physical NICs only: lo, bridges, veth and docker0 have no device link
+        # and get a new MAC on every restart
+        macs = [
+            _read_sysfs(f"/sys/class/net/{name}/address")
+            for name in os.listdir("/sys/class/net")
+            if name != "lo" and os.path.exists(f"/sys/class/net/{name}/device")
+        ]
+    else:  # macOS / BSD
+        macs = _MAC.findall(subprocess.check_output(["ifconfig"], timeout=10).decode())
+    macs = {mac.lower() for mac in macs if mac}
+    return sorted(macs - _NO_MAC)
+
+
+def _probe_drives():
+
+    drives = []
+    if platform.system() == "Windows":
+        output = _powershell(
+            "Get-WmiObject Win32_DiskDrive | Select-Object Model, SerialNumber"
+        )
+        for line in output.splitlines()[3:]:
+            parts = line.split()
+            if len(parts) >= 2:
+                drives.append({"model": " ".join(parts[:-1]), "serial": parts[-1]})
+    elif os.path.isdir("/sys/block"):
+        for name in sorted(os.listdir("/sys/block")):
+            if name.startswith(_VIRTUAL_BLOCK):
+                continue
+            device = f"/sys/block/{name}/device"
+            serial = _read_sysfs(f"{device}/serial") or _read_sysfs(
+                f"{device}/vpd_pg80"
+            )
+            if serial:
+                drives.append({"model": name, "serial": serial})
+    return drives
+
+
+def _probe_motherboard_serial():
+
+    if platform.system() == "Windows":
+        serial = _powershell("(Get-WmiObject Win32_BaseBoard).SerialNumber").strip()
+    else:
+        serial = _read_sysfs("/sys/class/dmi/id/board_serial")
+    return serial or "Unknown"
+
+
+def _probe_location():
+    import requests  # Deferred, only needed for the location lookup
+
+    response = requests.get(
+        "https://ipinfo.io/json", timeout=FINGERPRINT_LOCATION_TIMEOUT
+    )
+    location = response.json().get("loc") if response.status_code == 200 else None
+    return location.split(",") if location else ["Unknown", "Unknown"]
+
+
+_PROBES = {
+    "mac_addresses": (_probe_mac_addresses, []),
+    "drives": (_probe_drives, []),
+    "motherboard_serial": (_probe_motherboard_serial, "Unknown"),
+    "location": (_probe_location, ["Unknown", "Unknown"]),
+}
+
+
+def _collect_system_info():
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(_PROBES)) as pool:
+        futures = {name: pool.submit(probe) for name, (probe, _) in _PROBES.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Error fetching {name.replace('_', ' ')}: {e}")
+                results[name] = _PROBES[name][1]
+
+    latitude, longitude = results.pop("location")
+    return dict(results, latitude=latitude, longitude=longitude)
+
+
+def get_fingerprint(refresh=False):
+
+    # Returns (system info, digest), probed at most once per FINGERPRINT_TTL
+    with _fingerprint_lock:
+        if refresh or time.time() - _fingerprint["at"] > FINGERPRINT_TTL:
+            info = _collect_system_info()
+            _fingerprint.update(
+                at=time.time(), info=info, digest=fingerprint_digest(info)
+            )
+        return dict(_fingerprint["info"]), _fingerprint["digest"]
+
+
+def get_system_info(refresh=False):
+    return get_fingerprint(refresh)[0]
+
+
+def _coordinate(value):
+    try:
+        return round(float(value), 4)
+    except (TypeError, ValueError):  # "Unknown"
+        return 0.0
 
 
 def normalize_system_info(info):
@@ -194,8 +222,8 @@ def normalize_system_info(info):
                 "drives": sorted(
                     entry.get("drives", []), key=lambda d: d.get("serial", "")
                 ),
-                "latitude": round(float(entry.get("latitude", "0")), 4),
-                "longitude": round(float(entry.get("longitude", "0")), 4),
+                "latitude": _coordinate(entry.get("latitude", "0")),
+                "longitude": _coordinate(entry.get("longitude", "0")),
                 "motherboard_serial": entry.get("motherboard_serial", ""),
             }
             for entry in info
@@ -204,15 +232,83 @@ def normalize_system_info(info):
         return {
             "mac_addresses": sorted(info.get("mac_addresses", [])),
             "drives": sorted(info.get("drives", []), key=lambda d: d.get("serial", "")),
-            "latitude": round(float(info.get("latitude", "0")), 4),
-            "longitude": round(float(info.get("longitude", "0")), 4),
+            "latitude": _coordinate(info.get("latitude", "0")),
+            "longitude": _coordinate(info.get("longitude", "0")),
             "motherboard_serial": info.get("motherboard_serial", ""),
         }
     else:
         raise TypeError("Input must be a dictionary or a list of dictionaries")
 
 
-def validation_field(field_name: str, value: str, model=RegisterModel):
+def fingerprint_digest(info):
+    # Stable across key order and list order, stored on admin_log entries
+    normalized = normalize_system_info(info)
+    return hashlib.sha256(
+        json.dumps(normalized, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def backfill_fingerprint_digests():
+
+    # admin_log entries written before digests existed
+    updated = 0
+    for log in iter_documents("admin_log", {"fingerprint_digest": {"$exists": False}}):
+        update_documents(
+            "admin_log",
+            {"_id": log["_id"]},
+            {"$set": {"fingerprint_digest": fingerprint_digest(log)}},
+        )
+        updated += 1
+    return updated
+
+
+def _legacy_query(info):
+
+    # admin_log entries from the first collector, matched on the fields they
+    # stored: nothing is re-probed. Its Linux MAC regex only kept the fifth
+    # "xx:" octet of each address seen by ip link, and on Windows it stored the
+    # PowerShell addresses unchanged (upper case). Drive serials, board serial
+    # and location come from the same sources as now.
+    if platform.system() == "Windows":
+        macs = [mac.upper() for mac in info.get("mac_addresses", [])]
+    else:
+        macs = sorted({mac[12:15] for mac in info.get("mac_addresses", [])})
+    serials = [drive["serial"] for drive in info.get("drives", [])]
+    query = {
+        "motherboard_serial": info.get("motherboard_serial", "Unknown"),
+        "latitude": info.get("latitude", "Unknown"),
+        "longitude": info.get("longitude", "Unknown"),
+    }
+    if macs:
+        query["mac_addresses"] = {"$all": macs}
+    if serials:
+        query["drives.serial"] = {"$all": serials}
+    return query
+
+
+def _recorded(query):
+    return bool(find_documents("admin_log", query, limit=1, projection={"_id": 1}))
+
+
+def fingerprint_known(digest, info=None):
+
+    # One indexed lookup instead of normalising and scanning every admin_log.
+    # A machine recorded by the old collector matches on its stored fields and
+    # is re-enrolled in the current format, so the next login takes the fast path.
+    if _recorded({"fingerprint_digest": digest}):
+        return True
+    if info is None or not _recorded(_legacy_query(info)):
+        return False
+    insert_document("admin_log", dict(info, fingerprint_digest=digest))
+    return True
+
+
+def validation_field(field_name: str, value: str, model=None):
+    # Deferred, pydantic is the heaviest import on the login path
+    from pydantic import ValidationError, BaseModel
+    from models.all_models import RegisterModel
+
+    model = model or RegisterModel
 
     if field_name not in model.model_fields:
         return blue + f"Unknown field: {field_name}{reset}"
@@ -230,7 +326,7 @@ def validation_field(field_name: str, value: str, model=RegisterModel):
         return red + f"Validation error for '{field_name}': {error_message}{reset}"
 
 
-def validation_input(prompt, field_name, min_length=None, model=RegisterModel):
+def validation_input(prompt, field_name, min_length=None, model=None):
     while True:
         user_input = input_quit_handle(prompt).strip()
 
@@ -276,7 +372,7 @@ def sha256_encrypt(data: str) -> str:
 
 
 def bcrypt_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return hash_password(password)
 
 
 # def store_log(data: dict, file_path: Path):
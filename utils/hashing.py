@@ -0,0 +1,174 @@
+# Password hashing off the calling thread: a bounded bcrypt pool with a
+# calibrated work factor and rehash-on-login when the cost goes up.
+import os
+import hmac
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import bcrypt
+from utils.helpers import green, blue, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Fixed cost, or calibrated so one hash takes about BCRYPT_TARGET_MS here
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 0)) or None
+BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", 250))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", 10))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", 16))
+
+# thread (the pinned python_bcrypt releases the GIL while hashing) or process
+# (bcrypt builds that do not)
+HASH_POOL = os.getenv("HASH_POOL", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+# Hashes waiting behind the workers before callers get HashingBusy
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", 32))
+HASH_QUEUE_TIMEOUT_MS = int(os.getenv("HASH_QUEUE_TIMEOUT_MS", 2000))
+
+
+class HashingBusy(RuntimeError):
+    pass
+
+
+def _hashpw(password, salt):
+    # pyca/bcrypt works on bytes, python_bcrypt on str
+    try:
+        return bcrypt.hashpw(password.encode(), salt.encode()).decode()
+    except TypeError:
+        return bcrypt.hashpw(password, salt)
+
+
+def _gensalt(rounds):
+    salt = bcrypt.gensalt(rounds)
+    return salt.decode() if isinstance(salt, bytes) else salt
+
+
+def _hash(password, rounds):
+    return _hashpw(password, _gensalt(rounds))
+
+
+def _verify(password, hashed):
+    # The stored hash carries its own salt and cost
+    try:
+        return hmac.compare_digest(_hashpw(password, hashed), hashed)
+    except ValueError:  # Not a bcrypt hash
+        return False
+
+
+def hash_rounds(hashed):
+    # "$2b$12$..." -> 12
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+_calibrated = None
+_calibrate_lock = threading.Lock()
+
+
+def calibrate_rounds(target_ms=None):
+
+    # Each extra round doubles the cost, so one timing at the minimum is
+    # enough to extrapolate.
+    target_ms = target_ms or BCRYPT_TARGET_MS
+    started = time.perf_counter()
+    _hash("calibration", BCRYPT_MIN_ROUNDS)
+    took_ms = max((time.perf_counter() - started) * 1000, 0.001)
+    extra = max(0, int(math.floor(math.log2(target_ms / took_ms))))
+    rounds = min(BCRYPT_MIN_ROUNDS + extra, BCRYPT_MAX_ROUNDS)
+    expected_ms = took_ms * 2 ** (rounds - BCRYPT_MIN_ROUNDS)
+    logger.info(
+        green
+        + f"bcrypt calibrated: {rounds} rounds (~{expected_ms:.0f} ms, "
+        + f"target {target_ms} ms)"
+        + reset
+    )
+    return rounds
+
+
+def current_rounds():
+
+    global _calibrated
+    if BCRYPT_ROUNDS:
+        return BCRYPT_ROUNDS
+    if _calibrated is None:
+        with _calibrate_lock:
+            if _calibrated is None:
+                _calibrated = calibrate_rounds()
+    return _calibrated
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_MAX)
+
+
+def _get_executor():
+
+    global _executor, _executor_pid
+    # A pool inherited over fork has no worker threads, build a new one
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                pool = (
+                    ProcessPoolExecutor
+                    if HASH_POOL == "process"
+                    else ThreadPoolExecutor
+                )
+                _executor = pool(max_workers=HASH_WORKERS)
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _run(func, *args):
+    # Bounded: past HASH_WORKERS + HASH_QUEUE_MAX in flight, fail fast rather
+    # than queueing logins behind each other.
+    if not _slots.acquire(timeout=HASH_QUEUE_TIMEOUT_MS / 1000):
+        raise HashingBusy("Password hashing queue is full")
+    try:
+        return _get_executor().submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password, rounds=None):
+    return _run(_hash, password, rounds or current_rounds())
+
+
+def verify_password(password, hashed):
+    return _run(_verify, password, hashed)
+
+
+def needs_rehash(hashed):
+    # Only upgrades, hosts that calibrate lower never downgrade a hash
+    return hash_rounds(hashed) < current_rounds()
+
+
+def verify_and_upgrade(password, hashed):
+
+    # Returns (valid, new hash or None). The new hash is only computed after
+    # a successful check, when the stored cost is below the current one.
+    if not verify_password(password, hashed):
+        return False, None
+    if not needs_rehash(hashed):
+        return True, None
+    logger.info(
+        blue
+        + f"Rehashing password: {hash_rounds(hashed)} -> {current_rounds()} rounds"
+        + reset
+    )
+    return True, hash_password(password)
+
+
+def shutdown_hashing_pool():
+
+    global _executor
+    if _executor is not None and _executor_pid == os.getpid():
+        _executor.shutdown(wait=True)
+    _executor = None
@@ -0,0 +1,339 @@
+# Latency histograms for HTTP routes, Celery tasks and the Mongo/Redis calls
+# made inside them. Each process buffers observations and a background thread
+# adds them to Redis hashes, so /metrics shows every gunicorn worker and
+# Celery child in one place.
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from contextvars import ContextVar
+from pymongo import monitoring
+from utils.helpers import blue, red, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
+# Requests/tasks slower than this log their slowest dependency calls
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 500))
+SLOW_TOP_CALLS = int(os.getenv("SLOW_TOP_CALLS", 5))
+METRICS_PREFIX = "metrics:"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+# name: (help, label names)
+HISTOGRAMS = {
+    "http_request_duration_seconds": (
+        "Flask request latency",
+        ("method", "route", "status"),
+    ),
+    "celery_task_duration_seconds": ("Celery task run time", ("task", "state")),
+    "mongo_command_duration_seconds": (
+        "MongoDB command latency",
+        ("command", "collection", "outcome"),
+    ),
+    "redis_command_duration_seconds": (
+        "Redis command latency",
+        ("role", "command"),
+    ),
+}
+
+# Calls made during the current request/task: [(kind, what, seconds), ...]
+_scope = ContextVar("metrics_scope", default=None)
+# Set in the flusher thread so its own Redis writes are not measured
+_suppressed = ContextVar("metrics_suppressed", default=False)
+
+_pending = {}
+_pending_lock = threading.Lock()
+_flusher = {"pid": None, "thread": None}
+
+
+def _labels_key(labels):
+    return json.dumps(labels, sort_keys=True, separators=(",", ":"))
+
+
+def observe(name, labels, seconds):
+
+    if not METRICS_ENABLED or _suppressed.get():
+        return
+    key = (name, _labels_key(labels))
+    with _pending_lock:
+        entry = _pending.get(key)
+        if entry is None:
+            entry = _pending[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                entry[index] += 1
+                break
+        entry[-2] += seconds
+        entry[-1] += 1
+    _ensure_flusher()
+
+
+def _record_call(kind, what, metric, labels, seconds):
+    observe(metric, labels, seconds)
+    calls = _scope.get()
+    if calls is not None:
+        calls.append((kind, what, seconds))
+
+
+#
+# ---- Request / task scopes --->
+#
+
+
+def begin_scope():
+    # Returns a token for end_scope, calls made until then are attributed here
+    return _scope.set([]), time.perf_counter()
+
+
+def end_scope(scope, metric, labels, description):
+
+    token, started = scope
+    seconds = time.perf_counter() - started
+    calls = _scope.get() or []
+    _scope.reset(token)
+    observe(metric, labels, seconds)
+
+    if seconds * 1000 >= SLOW_REQUEST_MS:
+        slowest = sorted(calls, key=lambda call: call[2], reverse=True)
+        top = ", ".join(
+            f"{kind} {what} {call_seconds * 1000:.1f}ms"
+            for kind, what, call_seconds in slowest[:SLOW_TOP_CALLS]
+        )
+        spent = sum(call[2] for call in calls)
+        logger.warning(
+            blue
+            + f"Slow {description}: {seconds * 1000:.0f}ms, {len(calls)} call(s) "
+            + f"taking {spent * 1000:.0f}ms. Top: {top or 'none'}"
+            + reset
+        )
+    return seconds
+
+
+#
+# ---- Mongo / Redis instrumentation --->
+#
+
+
+class MongoCommandListener(monitoring.CommandListener):
+
+    # Registered on the MongoClient (connection/connect_db.py). Callbacks run
+    # on the thread that issued the command, so the scope is the caller's.
+
+    def __init__(self):
+        self.collections = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        self.collections[(event.connection_id, event.request_id)] = (
+            target if isinstance(target, str) else ""
+        )
+
+    def _finish(self, event, outcome):
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1e6
+        _record_call(
+            "mongo",
+            f"{event.command_name} {collection}".strip(),
+            "mongo_command_duration_seconds",
+            {
+                "command": event.command_name,
+                "collection": collection,
+                "outcome": outcome,
+            },
+            seconds,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+def mongo_listeners():
+    return [MongoCommandListener()] if METRICS_ENABLED else []
+
+
+def instrument_redis(client, role):
+
+    # Wraps this client's execute_command (plain calls, scripts) and the
+    # execute of its pipelines (one observation per round trip).
+    if not METRICS_ENABLED:
+        return client
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    def timed_execute_command(*args, **options):
+        started = time.perf_counter()
+        try:
+            return execute_command(*args, **options)
+        finally:
+            command = str(args[0]).upper() if args else "?"
+            _record_call(
+                "redis",
+                f"{role} {command}",
+                "redis_command_duration_seconds",
+                {"role": role, "command": command},
+                time.perf_counter() - started,
+            )
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def timed_execute(*execute_args, **execute_kwargs):
+            started = time.perf_counter()
+            try:
+                return execute(*execute_args, **execute_kwargs)
+            finally:
+                _record_call(
+                    "redis",
+                    f"{role} PIPELINE",
+                    "redis_command_duration_seconds",
+                    {"role": role, "command": "PIPELINE"},
+                    time.perf_counter() - started,
+                )
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    return client
+
+
+#
+# ---- Aggregation in Redis and Prometheus output --->
+#
+
+
+def flush_metrics():
+
+    # Adds the buffered observations to metrics:{name} hashes
+    global _pending
+    with _pending_lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return
+    from connection.connect_redis import get_redis_client
+
+    token = _suppressed.set(True)
+    try:
+        pipe = get_redis_client("default").pipeline(transaction=False)
+        for (name, labels), entry in batch.items():
+            key = METRICS_PREFIX + name
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if entry[index]:
+                    pipe.hincrby(key, f"{labels}|{bound}", entry[index])
+            pipe.hincrbyfloat(key, f"{labels}|sum", entry[-2])
+            pipe.hincrby(key, f"{labels}|count", entry[-1])
+        pipe.execute()
+    except Exception as e:
+        # Dropped rather than kept, memory stays bounded while Redis is down
+        logger.error(red + f"Failed to flush metrics: {e}" + reset)
+    finally:
+        _suppressed.reset(token)
+
+
+def _run_flusher():
+    _suppressed.set(True)
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        flush_metrics()
+
+
+def _ensure_flusher():
+    # One flusher per process, a forked child starts its own
+    if _flusher["pid"] == os.getpid():
+        return
+    with _pending_lock:
+        if _flusher["pid"] != os.getpid():
+            _flusher["pid"] = os.getpid()
+            _flusher["thread"] = threading.Thread(
+                target=_run_flusher, name="metrics-flusher", daemon=True
+            )
+            _flusher["thread"].start()
+
+
+def _forget_pending():
+    # A forked child must not report the parent's observations again
+    global _pending, _pending_lock
+    _pending = {}
+    _pending_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pending)
+atexit.register(flush_metrics)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_metrics():
+
+    # Prometheus text exposition format (version 0.0.4)
+    from connection.connect_redis import get_redis_client
+
+    flush_metrics()
+    token = _suppressed.set(True)
+    try:
+        pipe = get_redis_client("default").pipeline(transaction=False)
+        for name in HISTOGRAMS:
+            pipe.hgetall(METRICS_PREFIX + name)
+        stored = dict(zip(HISTOGRAMS, pipe.execute()))
+    finally:
+        _suppressed.reset(token)
+
+    lines = []
+    for name, (help_text, _) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        series = {}
+        for field, value in (stored.get(name) or {}).items():
+            labels, _, part = field.rpartition("|")
+            series.setdefault(labels, {})[part] = value
+        for labels, parts in sorted(series.items()):
+            label_map = json.loads(labels)
+            cumulative = 0
+            for bound in LATENCY_BUCKETS:
+                cumulative += int(parts.get(str(bound), 0))
+                lines.append(
+                    f"{name}_bucket{_format_labels(label_map, ('le', bound))} {cumulative}"
+                )
+            count = int(parts.get("count", 0))
+            lines.append(
+                f"{name}_bucket{_format_labels(label_map, ('le', '+Inf'))} {count}"
+            )
+            lines.append(
+                f"{name}_sum{_format_labels(label_map)} {float(parts.get('sum', 0))}"
+            )
+            lines.append(f"{name}_count{_format_labels(label_map)} {count}")
+    return "\n".join(lines) + "\n"
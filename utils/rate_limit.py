@@ -0,0 +1,133 @@
+# Rate limiting: every check is one server-side script, so one round trip and
+# no window where a key exists without a TTL.
+import os
+import uuid
+import logging
+from connection.connect_redis import get_redis_client
+from utils.helpers import red, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# sliding_window (exact log of attempts) or token_bucket (steady refill)
+RATE_LIMIT_ALGORITHM = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window")
+# Redis down: let the request through (true) or refuse it (false)
+RATE_LIMIT_FAIL_OPEN = os.getenv("RATE_LIMIT_FAIL_OPEN", "false").lower() == "true"
+
+# limit attempts per window seconds. The token bucket uses limit as capacity
+# and refills limit tokens per window.
+RATE_LIMITS = {
+    "login": {"limit": 5, "window": 300},
+    "reset": {"limit": 5, "window": 300},
+    "unlock": {"limit": 5, "window": 300},
+}
+
+# Both scripts take the clock from the Redis server (TIME, Redis >= 5) so app
+# servers with drifting clocks share one timeline.
+# KEYS: log | ARGV: limit, window ms, unique id
+_SLIDING_WINDOW = """
+local t = redis.call('time')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('zremrangebyscore', KEYS[1], 0, now - window)
+local count = redis.call('zcard', KEYS[1])
+if count < limit then
+    redis.call('zadd', KEYS[1], now, now .. ':' .. ARGV[3])
+    redis.call('pexpire', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+local oldest = redis.call('zrange', KEYS[1], 0, 0, 'withscores')
+return {0, 0, tonumber(oldest[2]) + window - now}
+"""
+
+# KEYS: bucket | ARGV: capacity, window ms, cost
+_TOKEN_BUCKET = """
+local t = redis.call('time')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local rate = capacity / tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed, retry = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) / rate)
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('pexpire', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, math.floor(tokens), retry}
+"""
+
+_ALGORITHMS = {"sliding_window": _SLIDING_WINDOW, "token_bucket": _TOKEN_BUCKET}
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, EVALSHA afterwards (reloaded on NOSCRIPT)
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_redis_client("rate_limit").register_script(
+            source
+        )
+    return script
+
+
+def preload_scripts():
+    # SCRIPT LOAD up front so a fresh worker never pays for NOSCRIPT
+    client = get_redis_client("rate_limit")
+    for source in _ALGORITHMS.values():
+        client.script_load(source)
+
+
+def _key(name, identifier, algorithm):
+    # The algorithm is part of the key, switching never reads the other's type
+    return f"rate_limit:{name}:{algorithm}:{identifier}"
+
+
+def hit(name, identifier, algorithm=None, cost=1):
+
+    # Counts one attempt and returns {allowed, remaining, retry_after (seconds)}
+    algorithm = algorithm or RATE_LIMIT_ALGORITHM
+    if algorithm not in _ALGORITHMS:
+        raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+    policy = RATE_LIMITS[name]
+    window_ms = policy["window"] * 1000
+    if algorithm == "sliding_window":
+        # Every attempt is its own member in the log, cost does not apply
+        args = [policy["limit"], window_ms, uuid.uuid4().hex]
+    else:
+        args = [policy["limit"], window_ms, cost]
+    try:
+        allowed, remaining, retry_ms = _script(_ALGORITHMS[algorithm])(
+            keys=[_key(name, identifier, algorithm)], args=args
+        )
+    except Exception as e:
+        logger.error(red + f"Rate limiter unavailable for {name}: {e}" + reset)
+        return {
+            "allowed": RATE_LIMIT_FAIL_OPEN,
+            "remaining": 0,
+            "retry_after": 0 if RATE_LIMIT_FAIL_OPEN else policy["window"],
+        }
+    return {
+        "allowed": bool(allowed),
+        "remaining": int(remaining),
+        "retry_after": round(int(retry_ms) / 1000, 3),
+    }
+
+
+def reset_limit(name, identifier, algorithm=None):
+
+    # Clears the counter, e.g. after a successful login
+    algorithm = algorithm or RATE_LIMIT_ALGORITHM
+    try:
+        get_redis_client("rate_limit").delete(_key(name, identifier, algorithm))
+    except Exception as e:
+        logger.error(red + f"Failed to reset rate limit for {name}: {e}" + reset)
@@ -1,6 +1,8 @@
 import os
+import time
 import logging
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from utils.helpers import green, red, reset
 from email.mime.multipart import MIMEMultipart
@@ -11,6 +13,24 @@ serializer = URLSafeTimedSerializer(os.getenv("SECRET_KEY"))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT") or 465)
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_FROM = os.getenv("SMTP_FROM") or SMTP_USER
+# ssl (implicit TLS, port 465), starttls (port 587) or plain (local stand-in)
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+# An idle connection is checked with NOOP before reuse, servers drop them
+SMTP_IDLE_SECONDS = int(os.getenv("SMTP_IDLE_SECONDS", 30))
+SMTP_MAX_MESSAGES = int(os.getenv("SMTP_MAX_MESSAGES", 100))
+
+# Mail goes through the "mail" Celery queue; MAIL_SYNC=true sends inline
+MAIL_SYNC = os.getenv("MAIL_SYNC", "false").lower() == "true"
+MAIL_TASK = "tasks.send_mail"
+MAIL_QUEUE = "mail"
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+
 
 def generate_confirmation_token(email, salt="email-confirm-salt"):
 
@@ -25,28 +45,172 @@ def confirm_token(token, salt="email-confirm-salt", expiration=300):
     return email
 
 
-def send_email(to_email, subject, body):
+def build_message(to_email, subject, body):
+
+    message = MIMEMultipart()
+    message["From"] = SMTP_FROM
+    message["To"] = to_email
+    message["Subject"] = subject
+    message.attach(MIMEText(body, "html"))
+    return message.as_string()
+
+
+class _SmtpConnection:
+
+    # One authenticated connection per process, reused across sends
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.server = None
+        self.last_used = 0.0
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if SMTP_SECURITY == "ssl":
+            server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+            if SMTP_SECURITY == "starttls":
+                server.starttls()
+        server.ehlo_or_helo_if_needed()
+        # The local stand-in does not offer AUTH
+        if SMTP_USER and server.has_extn("auth"):
+            server.login(SMTP_USER, SMTP_PASS)
+        self.server, self.sent = server, 0
+        logger.info(green + f"SMTP connection to {SMTP_HOST} opened" + reset)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        self.server = None
+
+    def _usable(self):
+        if self.server is None or self.sent >= SMTP_MAX_MESSAGES:
+            return False
+        if time.monotonic() - self.last_used < SMTP_IDLE_SECONDS:
+            return True
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, to_email, message):
+        if not self._usable():
+            self.close()
+            self._connect()
+        try:
+            self.server.sendmail(SMTP_FROM, to_email, message)
+        except smtplib.SMTPServerDisconnected:
+            # Dropped between the check and the send, one reconnect
+            self._connect()
+            self.server.sendmail(SMTP_FROM, to_email, message)
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def _get_connection():
+
+    global _connection
+    with _connection_lock:
+        # A socket inherited over fork is shared with the parent, start over
+        if _connection is None or _connection.pid != os.getpid():
+            _connection = _SmtpConnection()
+        return _connection
+
+
+def close_smtp_connection():
+
+    with _connection_lock:
+        if _connection is not None and _connection.pid == os.getpid():
+            _connection.close()
+
+
+def deliver(messages):
+
+    # Sends [{to, subject, body}, ...] over the pooled connection. Returns the
+    # messages worth retrying; permanently refused ones are logged and dropped.
+    retry = []
+    connection = _get_connection()
+    with connection.lock:
+        for index, mail in enumerate(messages):
+            try:
+                connection.send(
+                    mail["to"], build_message(mail["to"], mail["subject"], mail["body"])
+                )
+                logger.info(green + f"Email sent to {mail['to']}" + reset)
+            except smtplib.SMTPRecipientsRefused as e:
+                logger.error(red + f"Recipient refused {mail['to']}: {e}" + reset)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    logger.error(red + f"Email to {mail['to']} rejected: {e}" + reset)
+                else:
+                    retry.append(mail)
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection level, the rest of the batch goes back as well
+                logger.error(red + f"SMTP connection failed: {e}" + reset)
+                connection.close()
+                retry.extend(messages[index:])
+                break
+    return retry
+
+
+def _enqueue(messages):
+    from celery_app import celery  # Deferred, avoids an import cycle via tasks
+
+    # Returns the messages that could not be queued. With the broker down the
+    # caller (a login waiting on its 2FA code) must fall back to sending inline
+    # right away: one connect attempt (max_retries=0 on this connection), no
+    # publish retries, and no result subscription, whose own reconnect loop
+    # on the backend would stall the caller for ~20 s.
+    options = dict(celery.conf.broker_transport_options, max_retries=0)
+    start = 0
+    try:
+        with celery.connection_for_write(transport_options=options) as connection:
+            for start in range(0, len(messages), MAIL_BATCH_SIZE):
+                celery.send_task(
+                    MAIL_TASK,
+                    args=[messages[start : start + MAIL_BATCH_SIZE]],
+                    queue=MAIL_QUEUE,
+                    retry=False,
+                    ignore_result=True,
+                    connection=connection,
+                )
+    except Exception as e:
+        logger.error(red + f"Mail queue unavailable, sending inline: {e}" + reset)
+        return messages[start:]
+    return []
+
 
+def send_bulk_email(messages):
+
+    # [{to, subject, body}, ...], queued in batches that share one connection
+    if not messages:
+        return
+    if not MAIL_SYNC:
+        # Batches already queued are not sent a second time
+        messages = _enqueue(messages)
+        if not messages:
+            return
     try:
-        smtp_host = os.getenv("SMTP_HOST")
-        smtp_port = os.getenv("SMTP_PORT")
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_pass = os.getenv("SMTP_PASS")
-
-        message = MIMEMultipart()
-        message["From"] = smtp_user
-        message["To"] = to_email
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "html"))
-
-        with smtplib.SMTP_SSL(smtp_host, smtp_port) as server:
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(smtp_user, to_email, message.as_string())
-            logger.info(green + f"Email sent to {to_email}" + reset)
+        failed = deliver(messages)
+        if failed:
+            logger.error(red + f"{len(failed)} email(s) not sent" + reset)
     except Exception as e:
         logger.error(red + f"Error sending email: {e}" + reset)
 
 
+def send_email(to_email, subject, body):
+    send_bulk_email([{"to": to_email, "subject": subject, "body": body}])
+
+
 # 2fa is to small to give a sepparate file
 
 
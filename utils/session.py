@@ -1,36 +1,163 @@
 import os
+import time
 import uuid
+import logging
 import jwt as pyjwt
-from flask import jsonify
 from datetime import datetime, timedelta
-from db.redis_operations import redis_client
-from utils.helpers import green, reset
+from connection.connect_redis import get_redis_client
+from utils.helpers import red, reset
 
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 SESSION_KEY = os.getenv("SESSION_KEY")
-
-
-def create_session(user_id):
+SESSION_TTL = int(os.getenv("SESSION_TTL", 900))  # Sliding, 15min by default
+
+# session:{token} is a small hash (uid, created, seen, any metadata), kept in
+# Redis' compact listpack encoding. user_sessions:{user_id} is a set of the
+# user's tokens, used for bulk revocation.
+SESSION_PREFIX = "session:"
+USER_SESSIONS_PREFIX = "user_sessions:"
+# Absolute lifetime: sliding never keeps a session past created + this. The
+# user index expires with its newest session, so verifying never touches it.
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 24 * 3600))
+
+# Every script declares the one key it touches (KEYS), so each runs on one
+# hash slot; the user index is updated with separate commands.
+
+# Lookup, sliding TTL (capped at the absolute lifetime) and metadata update
+# in one round trip.
+# KEYS: session | ARGV: ttl, now, max age, field, value, ...
+_VERIFY = """
+local session = redis.call('hmget', KEYS[1], 'uid', 'created')
+if not session[1] then
+    return false
+end
+local left = tonumber(session[2]) + tonumber(ARGV[3]) - tonumber(ARGV[2])
+if left <= 0 then
+    redis.call('del', KEYS[1])
+    return false
+end
+redis.call('expire', KEYS[1], math.min(tonumber(ARGV[1]), left))
+redis.call('hset', KEYS[1], 'seen', ARGV[2], unpack(ARGV, 4))
+return session[1]
+"""
+
+# Read and delete in one step, returns the uid so the caller can clean the index
+# KEYS: session
+_DESTROY = """
+local uid = redis.call('hget', KEYS[1], 'uid')
+redis.call('del', KEYS[1])
+return uid
+"""
+
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, EVALSHA afterwards (reloaded on NOSCRIPT)
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_redis_client("session").register_script(source)
+    return script
+
+
+def preload_scripts():
+    # SCRIPT LOAD up front so a fresh worker never pays for NOSCRIPT
+    client = get_redis_client("session")
+    for source in (_VERIFY, _DESTROY):
+        client.script_load(source)
+
+
+def _flatten(metadata):
+    args = []
+    for field, value in metadata.items():
+        args.extend([field, str(value)])
+    return args
+
+
+def create_session(user_id, ttl=SESSION_TTL, **metadata):
 
     session_token = str(uuid.uuid4())
-    redis_client.set(
-        green + f"session: {session_token}" + reset, user_id, ex=900
-    )  # Expires in 15min
+    now = int(time.time())
+    fields = dict(metadata, uid=str(user_id), created=now, seen=now)
+    index = USER_SESSIONS_PREFIX + str(user_id)
+    try:
+        # One round trip; not a transaction, the two keys may live on
+        # different cluster nodes
+        pipe = get_redis_client("session").pipeline(transaction=False)
+        pipe.hset(SESSION_PREFIX + session_token, mapping=fields)
+        pipe.expire(SESSION_PREFIX + session_token, min(ttl, SESSION_MAX_AGE))
+        pipe.sadd(index, session_token)
+        # No session of this user outlives the newest one's absolute lifetime
+        pipe.expire(index, SESSION_MAX_AGE)
+        pipe.execute()
+    except Exception as e:
+        logger.error(red + f"Failed to create session for {user_id}: {e}" + reset)
+        return None
     return session_token
 
 
-def verify_session(session_token):
+def verify_session(session_token, ttl=SESSION_TTL, **metadata):
 
-    user_id = redis_client.expire(green + f"session: {session_token}" + reset)
-    if user_id:
-        redis_client.expire(green + f"session: {session_token}" + reset, 900)
-        return user_id
-    return None
+    # Returns the user id and slides the expiry, or None (also when Redis is
+    # unreachable: fail closed).
+    metadata = {k: v for k, v in metadata.items() if k not in ("uid", "created")}
+    try:
+        return _script(_VERIFY)(
+            keys=[SESSION_PREFIX + session_token],
+            args=[ttl, int(time.time()), SESSION_MAX_AGE, *_flatten(metadata)],
+        )
+    except Exception as e:
+        logger.error(red + f"Failed to verify session: {e}" + reset)
+        return None
+
+
+def get_session(session_token):
+
+    # Read-only view of the session hash, does not slide the expiry
+    try:
+        return (
+            get_redis_client("session").hgetall(SESSION_PREFIX + session_token) or None
+        )
+    except Exception as e:
+        logger.error(red + f"Failed to read session: {e}" + reset)
+        return None
 
 
 def destroy_session(session_token):
 
-    redis_client.delete(green + f"session: {session_token}" + reset)
+    try:
+        uid = _script(_DESTROY)(keys=[SESSION_PREFIX + session_token])
+        if uid:
+            get_redis_client("session").srem(USER_SESSIONS_PREFIX + uid, session_token)
+        return bool(uid)
+    except Exception as e:
+        logger.error(red + f"Failed to destroy session: {e}" + reset)
+        return False
+
+
+def revoke_user_sessions(user_id):
+
+    # Logs out every session of the user, returns how many were revoked.
+    # Only the tokens read here are removed from the index, a session created
+    # meanwhile stays listed.
+    index = USER_SESSIONS_PREFIX + str(user_id)
+    try:
+        client = get_redis_client("session")
+        tokens = list(client.smembers(index))
+        if not tokens:
+            return 0
+        pipe = client.pipeline(transaction=False)
+        pipe.unlink(*[SESSION_PREFIX + token for token in tokens])
+        pipe.srem(index, *tokens)
+        pipe.execute()
+        return len(tokens)
+    except Exception as e:
+        logger.error(red + f"Failed to revoke sessions of {user_id}: {e}" + reset)
+        return 0
 
 
 def create_jwt(user_id, email):
@@ -46,6 +173,7 @@ def create_jwt(user_id, email):
 
 
 def verify_jwt(token):
+    from flask import jsonify  # Deferred, the CLI does not need Flask
 
     try:
         decoded_token = pyjwt.decode(token, SESSION_KEY, algorithms=["HS256"])
@@ -0,0 +1,172 @@
+# 2FA codes shared by the CLI login and the Flask routes. Codes live in Redis
+# as an HMAC (never in plain text), expire after TWO_FACTOR_TTL and allow
+# TWO_FACTOR_MAX_ATTEMPTS guesses before they are burned. The plain code only
+# exists in the process that mails it, it never goes through the broker.
+import os
+import hmac
+import hashlib
+import logging
+import secrets
+from connection.connect_redis import get_redis_client
+from db.audit import log_audit_event
+from utils.sendmail import deliver, MAIL_SYNC, MAIL_QUEUE
+from utils.helpers import red, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+TWO_FACTOR_TTL = int(os.getenv("TWO_FACTOR_TTL", 300))
+TWO_FACTOR_MAX_ATTEMPTS = int(os.getenv("TWO_FACTOR_MAX_ATTEMPTS", 5))
+TWO_FACTOR_DIGITS = 6
+TWO_FACTOR_PREFIX = "2fa:"
+TWO_FACTOR_TASK = "tasks.send_2fa_code"
+# A queued send older than this is dropped, the user has asked again by then
+TWO_FACTOR_SEND_EXPIRES = int(os.getenv("TWO_FACTOR_SEND_EXPIRES", 60))
+
+# Pepper for the stored HMAC, a leaked Redis dump alone cannot brute force
+# the 10**6 possible codes.
+_PEPPER = (os.getenv("SESSION_KEY") or os.getenv("SECRET_KEY") or "").encode()
+
+# Counts the attempt, compares and burns the code on success or on the last
+# attempt, all in one round trip.
+# KEYS: code hash | ARGV: digest, max attempts
+# Returns {status, attempts left}: 1 ok, 0 wrong, -1 missing/expired, -2 burned
+_VERIFY = """
+local stored = redis.call('hget', KEYS[1], 'h')
+if not stored then
+    return {-1, 0}
+end
+local attempts = redis.call('hincrby', KEYS[1], 'attempts', 1)
+if stored == ARGV[1] then
+    redis.call('del', KEYS[1])
+    return {1, 0}
+end
+local left = tonumber(ARGV[2]) - attempts
+if left <= 0 then
+    redis.call('del', KEYS[1])
+    return {-2, 0}
+end
+return {0, left}
+"""
+
+_MESSAGES = {
+    1: "2FA code verified",
+    0: "Invalid 2FA code",
+    -1: "2FA code expired or not requested",
+    -2: "Too many invalid attempts, request a new code",
+}
+
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, EVALSHA afterwards (reloaded on NOSCRIPT)
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_redis_client("session").register_script(source)
+    return script
+
+
+def preload_scripts():
+    # SCRIPT LOAD up front so a fresh worker never pays for NOSCRIPT
+    get_redis_client("session").script_load(_VERIFY)
+
+
+def _digest(user_id, code):
+    message = f"{user_id}:{str(code).strip()}".encode()
+    return hmac.new(_PEPPER, message, hashlib.sha256).hexdigest()
+
+
+def send_code(user_id, email):
+
+    # Stores a fresh code (replacing any pending one) and mails it inline.
+    # Runs in the mail worker, or in the caller when the queue is unavailable.
+    code = f"{secrets.randbelow(10**TWO_FACTOR_DIGITS):0{TWO_FACTOR_DIGITS}d}"
+    key = TWO_FACTOR_PREFIX + str(user_id)
+    try:
+        pipe = get_redis_client("session").pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping={"h": _digest(user_id, code), "attempts": 0})
+        pipe.expire(key, TWO_FACTOR_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.error(red + f"Failed to store 2FA code for {user_id}: {e}" + reset)
+        return False
+
+    mail = {
+        "to": email,
+        "subject": "Your 2FA Code",
+        "body": f"Your 2FA code is {code} Please enter it to complete the login process.",
+    }
+    try:
+        if deliver([mail]):
+            logger.error(red + f"2FA code for {user_id} not sent" + reset)
+            return False
+    except Exception as e:
+        logger.error(red + f"Error sending 2FA code for {user_id}: {e}" + reset)
+        return False
+    log_audit_event(
+        user_id=str(user_id),
+        email=email,
+        action="2FA Code Sent",
+        details={"expires_in": TWO_FACTOR_TTL},
+    )
+    return True
+
+
+def _enqueue(user_id, email):
+    from celery_app import celery  # Deferred, avoids an import cycle via tasks
+
+    # Fail fast like utils.sendmail._enqueue. Only the user id and address are
+    # queued, the worker generates the code.
+    options = dict(celery.conf.broker_transport_options, max_retries=0)
+    try:
+        with celery.connection_for_write(transport_options=options) as connection:
+            celery.send_task(
+                TWO_FACTOR_TASK,
+                args=[str(user_id), email],
+                queue=MAIL_QUEUE,
+                expires=TWO_FACTOR_SEND_EXPIRES,
+                retry=False,
+                ignore_result=True,
+                connection=connection,
+            )
+        return True
+    except Exception as e:
+        logger.error(red + f"Mail queue unavailable, sending 2FA inline: {e}" + reset)
+        return False
+
+
+def issue_code(user_id, email):
+    if not MAIL_SYNC and _enqueue(user_id, email):
+        return True
+    return send_code(user_id, email)
+
+
+def verify_code(user_id, code, email=None):
+
+    # Returns {success, message, attempts_left}
+    try:
+        status, left = _script(_VERIFY)(
+            keys=[TWO_FACTOR_PREFIX + str(user_id)],
+            args=[_digest(user_id, code), TWO_FACTOR_MAX_ATTEMPTS],
+        )
+    except Exception as e:
+        logger.error(red + f"Failed to verify 2FA code for {user_id}: {e}" + reset)
+        return {"success": False, "message": "2FA unavailable", "attempts_left": 0}
+
+    status = int(status)
+    if status != 1:
+        log_audit_event(
+            user_id=str(user_id),
+            email=email,
+            action="2FA Code Rejected",
+            details={"reason": _MESSAGES[status]},
+        )
+    return {
+        "success": status == 1,
+        "message": _MESSAGES[status],
+        "attempts_left": int(left),
+    }
@@ -0,0 +1,14 @@
+# Flask app factory, routes live in one blueprint per area.
+from flask import Flask
+
+
+def create_app():
+
+    from web import auth, data, maintenance, metrics
+
+    app = Flask(__name__)
+    metrics.init_app(app)
+    app.register_blueprint(maintenance.bp)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(data.bp)
+    return app
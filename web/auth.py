@@ -0,0 +1,180 @@
+# Auth routes: 2FA, password reset, account unlock and the login rate limit.
+from flask import Blueprint, jsonify, request
+from utils.helpers import reset, red
+from db.db_operations import find_documents
+from utils.rate_limit import hit
+from utils.sendmail import confirm_token
+from utils.two_factor import issue_code, verify_code
+from login.reset_pass import reset_password, confirm_reset_token
+from login.unlock_account import unlock_account, confirm_unlock_token
+
+bp = Blueprint("auth", __name__)
+
+
+@bp.route("/confirm/2fa/<token>", methods=["GET"])
+def confirm_2fa_email(token):
+
+    try:
+        email = confirm_token(token)
+        if email:
+            return jsonify(
+                {"success": True, "message": "Email confirmed!", "email": email}
+            )
+        else:
+            raise ValueError(red + "Invalid token" + reset)
+    except Exception:
+        return jsonify({"success": False, "message": "Invalid or expired token"}), 400
+
+
+@bp.route("/send-2fa", methods=["POST"])
+def send_2fa():
+
+    data = request.json
+    email = data.get("email")
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+
+    user = find_documents("admin", {"email": email})
+    if not user:
+        return jsonify({"success": False, "message": "User not found"}), 404
+
+    # The code only travels by email, it is never part of the response
+    if not issue_code(str(user[0]["_id"]), email):
+        return jsonify({"success": False, "message": "Failed to send 2FA code"}), 500
+    return jsonify({"success": True, "message": "2FA code sent successfully"})
+
+
+@bp.route("/verify-2fa", methods=["POST"])
+def verify_2fa():
+
+    data = request.json
+    email = data.get("email")
+    code = data.get("code")
+
+    if not email or not code:
+        return (
+            jsonify({"success": False, "message": "Both email and code are required"}),
+            400,
+        )
+
+    user = find_documents("admin", {"email": email})
+    if not user:
+        return jsonify({"success": False, "message": "Invalid 2FA code"}), 401
+
+    result = verify_code(str(user[0]["_id"]), code, email=email)
+    status_code = 200 if result["success"] else 401
+    return jsonify(result), status_code
+
+
+@bp.route("/reset-password/<token>", methods=["GET", "POST"])
+def reset_password_route(token):
+    if request.method == "GET":
+        # Validate the token
+        email = confirm_reset_token(token, salt="password-reset-salt", expiration=600)
+        if not email:
+            return (
+                jsonify({"success": False, "message": "Invalid or expired token"}),
+                400,
+            )
+
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Token is valid. Please submit your new password.",
+                    "email": email,
+                    "code": token,
+                }
+            ),
+            200,
+        )
+
+    if request.method == "POST":
+        data = request.json
+        new_password = data.get("new_password")
+        if not new_password:
+            return (
+                jsonify({"success": False, "message": "New password is required"}),
+                400,
+            )
+
+        # Validate the token again in case of tampering
+        email = confirm_reset_token(token, salt="password-reset-salt")
+        if not email:
+            return (
+                jsonify({"success": False, "message": "Invalid or expired token"}),
+                400,
+            )
+
+        response = reset_password(token, new_password)
+
+        status_code = 200 if response["success"] else 400
+        return jsonify(response), status_code
+
+
+@bp.route("/unlock-account/<token>", methods=["GET", "POST"])
+def unlock_account_route(token):
+    if request.method == "GET":
+        # Validate the token
+        email = confirm_unlock_token(token, salt="unlock-account-salt")
+        if not email:
+            return (
+                jsonify({"success": False, "message": "Invalid or expired token"}),
+                400,
+            )
+
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Token is valid. Please confirm account unlocking.",
+                    "code": token,
+                }
+            ),
+            200,
+        )
+
+    if request.method == "POST":
+        try:
+            email = confirm_unlock_token(token, salt="unlock-account-salt")
+            if not email:
+                return (
+                    jsonify({"success": False, "message": "Invalid or expired token"}),
+                    400,
+                )
+
+            admin = find_documents("admin", {"email": email})
+            if not admin:
+                return jsonify({"success": False, "message": "User not found"}), 404
+
+            response = unlock_account(email)
+            action = (
+                "ACCOUNT_UNLOCKED" if response["success"] else "ACCOUNT_UNLOCK_FAILED"
+            )
+
+            status_code = 200 if response["success"] else 400
+            return jsonify(response), status_code
+        except Exception as e:
+            return jsonify({"success": False, "message": "Server error occurred"}), 500
+
+
+@bp.route("/rate-limited-login", methods=["GET"])
+def rate_limited_login():
+
+    data = request.json
+    email = data.get("email")
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+
+    limit = hit("login", email)
+    if not limit["allowed"]:
+        response = jsonify(
+            {
+                "success": False,
+                "message": "Too many attempts. Try again later.",
+                "retry_after": limit["retry_after"],
+            }
+        )
+        return response, 429, {"Retry-After": str(int(limit["retry_after"]) + 1)}
+
+    return jsonify({"success": True, "remaining": limit["remaining"]}), 200
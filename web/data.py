@@ -0,0 +1,278 @@
+# Data routes: session-guarded reads (audit log, pipeline collections, ...).
+import os
+import re
+from datetime import datetime
+from bson.objectid import ObjectId
+from flask import Blueprint, Response, jsonify, request
+from pymongo.errors import PyMongoError
+from db.audit import get_audit_logs, count_audit_actions_per_hour
+from db.db_operations import find_documents, iter_documents
+from db.snapshots import available_encodings, etag_for, get_snapshot, snapshot_etag
+from utils.session import verify_session
+
+bp = Blueprint("data", __name__)
+
+FUNDS = ("renaissance", "bridgewater", "citadel")
+DATA_PAGE_DEFAULT = 50
+DATA_PAGE_MAX = 500
+DATA_MAX_FIELDS = 20
+DATA_QUERY_MAX_MS = int(os.getenv("DATA_QUERY_MAX_MS", 5000))
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+# Page order per collection: (field, direction, cursor parser). _id breaks ties
+# in the same direction, the indexes in db/indexes.py carry the same suffix.
+READ_ORDER = {
+    "top_company": ("company_name", 1, str),
+    "starting_profit": ("company_name", 1, str),
+    **{fund: ("filing_date", -1, datetime.fromisoformat) for fund in FUNDS},
+}
+
+
+@bp.route("/protected", methods=["GET"])
+def protected():
+
+    session_token = request.headers.get("Authorization")
+    if not session_token:
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    user_id = verify_session(session_token)
+    if not user_id:
+        return jsonify({"success": False, "message": "Session expired or invalid"}), 401
+
+    # Retrieve user data from MongoDB (if needed)
+    user = find_documents("admin", {"_id": ObjectId(user_id)})
+    if not user:
+        return jsonify({"success": False, "message": "User not found"}), 404
+
+    return jsonify({"success": True, "message": f"Welcome, {user[0]['email']}!"})
+
+
+def _audit_filters():
+    # Raises ValueError on a malformed date or limit
+    since = request.args.get("since")
+    until = request.args.get("until")
+    return {
+        "user_id": request.args.get("user_id"),
+        "since": datetime.fromisoformat(since) if since else None,
+        "until": datetime.fromisoformat(until) if until else None,
+    }
+
+
+@bp.route("/audit-logs", methods=["GET"])
+def audit_logs():
+
+    session_token = request.headers.get("Authorization")
+    if not session_token or not verify_session(session_token):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        page = get_audit_logs(
+            action=request.args.get("action"),
+            limit=int(request.args.get("limit", 50)),
+            after=request.args.get("after"),
+            **_audit_filters(),
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    logs = [dict(log, _id=str(log["_id"])) for log in page["logs"]]
+    return jsonify({"success": True, "logs": logs, "next": page["next"]})
+
+
+@bp.route("/audit-logs/hourly", methods=["GET"])
+def audit_logs_hourly():
+
+    session_token = request.headers.get("Authorization")
+    if not session_token or not verify_session(session_token):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        counts = count_audit_actions_per_hour(**_audit_filters())
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "counts": counts})
+
+
+#
+# ---- Read API over the pipeline collections --->
+#
+
+
+def _projection(field):
+    # ?fields=a,b -> {a: 1, b: 1}, plus the sort field the cursor is built from
+    fields = request.args.get("fields")
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if len(names) > DATA_MAX_FIELDS or not all(map(_FIELD_NAME.match, names)):
+        raise ValueError(f"fields takes up to {DATA_MAX_FIELDS} field names")
+    return {name: 1 for name in sorted({*names, field})}
+
+
+def _encode_cursor(document, field):
+    value = document.get(field)
+    value = value.isoformat() if isinstance(value, datetime) else value
+    return f"{value}|{document['_id']}"
+
+
+def _decode_cursor(cursor, parse):
+    try:
+        value, separator, object_id = cursor.rpartition("|")
+        if not separator:
+            raise ValueError
+        if ObjectId.is_valid(object_id):
+            object_id = ObjectId(object_id)
+        return parse(value), object_id
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _shape(collection_key, query, limit, projection):
+    field, direction, _ = READ_ORDER[collection_key]
+    return {
+        "query": query,
+        "sort_by": [(field, direction), ("_id", direction)],
+        # One extra document tells us whether there is a next page
+        "limit": limit + 1,
+        "projection": projection,
+    }
+
+
+def _page_shape(collection_key, query):
+
+    # find() arguments of the requested page, keyset-paginated on (field, _id)
+    field, direction, parse = READ_ORDER[collection_key]
+    after = request.args.get("after")
+    if after:
+        value, object_id = _decode_cursor(after, parse)
+        operator = "$gt" if direction == 1 else "$lt"
+        query["$or"] = [
+            {field: {operator: value}},
+            {field: value, "_id": {operator: object_id}},
+        ]
+    limit = request.args.get("limit", DATA_PAGE_DEFAULT)
+    limit = max(1, min(int(limit), DATA_PAGE_MAX))
+    return _shape(collection_key, query, limit, _projection(field))
+
+
+def _build_page(collection_key, shape):
+    field = READ_ORDER[collection_key][0]
+    limit = shape["limit"] - 1
+    documents = list(
+        iter_documents(collection_key, max_time_ms=DATA_QUERY_MAX_MS, **shape)
+    )
+    next_cursor = (
+        _encode_cursor(documents[limit - 1], field) if len(documents) > limit else None
+    )
+    return {"success": True, "items": documents[:limit], "next": next_cursor}
+
+
+def warm_read_api():
+
+    # Builds the first page of every read route (no filters, default limit),
+    # the one a UI asks for first. Called from web/warmup.py.
+    for collection_key in READ_ORDER:
+        shape = _shape(collection_key, {}, DATA_PAGE_DEFAULT, None)
+        get_snapshot(
+            collection_key,
+            shape,
+            lambda: _build_page(collection_key, shape),
+            available_encodings(),
+        )
+
+
+def _accepted_encodings():
+    # Preferred first, identity always last (and always acceptable here)
+    return [
+        encoding
+        for encoding in available_encodings()
+        if encoding == "identity" or request.accept_encodings.quality(encoding) > 0
+    ]
+
+
+def _cache_headers(response):
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _not_modified(collection_key, shape):
+    etag = snapshot_etag(collection_key, shape)
+    if not etag:
+        return None
+    for encoding in available_encodings():
+        tag = etag_for(etag, encoding)
+        if request.if_none_match.contains_weak(tag):
+            response = Response(status=304)
+            response.set_etag(tag)
+            return _cache_headers(response)
+    return None
+
+
+def _read_response(collection_key, query):
+
+    session_token = request.headers.get("Authorization")
+    if not session_token or not verify_session(session_token):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    try:
+        shape = _page_shape(collection_key, query)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    # Conditional GET: answered from the ETag stored in Redis, Mongo untouched
+    if request.if_none_match:
+        response = _not_modified(collection_key, shape)
+        if response is not None:
+            return response
+
+    try:
+        etag, encoding, body = get_snapshot(
+            collection_key,
+            shape,
+            lambda: _build_page(collection_key, shape),
+            _accepted_encodings(),
+        )
+    except PyMongoError as e:
+        return jsonify({"success": False, "message": f"Data unavailable: {e}"}), 503
+
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag_for(etag, encoding))
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return _cache_headers(response)
+
+
+def _company_filter():
+    company = request.args.get("company")
+    return {"company_name": company} if company else {}
+
+
+@bp.route("/top-companies", methods=["GET"])
+def top_companies():
+    return _read_response("top_company", _company_filter())
+
+
+@bp.route("/starting-profit", methods=["GET"])
+def starting_profit():
+    return _read_response("starting_profit", _company_filter())
+
+
+@bp.route("/funds/<fund>/filings", methods=["GET"])
+def fund_filings(fund):
+
+    if fund not in FUNDS:
+        return jsonify({"success": False, "message": f"Unknown fund: {fund}"}), 404
+    query = _company_filter()
+    try:
+        since = request.args.get("since")
+        until = request.args.get("until")
+        if since or until:
+            query["filing_date"] = {}
+            if since:
+                query["filing_date"]["$gte"] = datetime.fromisoformat(since)
+            if until:
+                query["filing_date"]["$lt"] = datetime.fromisoformat(until)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return _read_response(fund, query)
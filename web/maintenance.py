@@ -0,0 +1,24 @@
+# Maintenance routes: status page and manual Celery triggers.
+from flask import Blueprint, jsonify, request
+
+bp = Blueprint("maintenance", __name__)
+
+
+@bp.route("/trigger-maintenance", methods=["POST"])
+def trigger_maintenance():
+    # By name, the web workers never import tasks (and its dependencies)
+    from celery_app import celery
+
+    task = request.json.get("task")
+    if task == "clean_cache":
+        celery.send_task("tasks.clean_redis_cache")
+        return jsonify({"message": "Redis cache cleanup task triggered."}), 200
+    elif task == "update_30f":
+        celery.send_task("tasks.check_and_update_30f")
+        return jsonify({"message": "30F filings update task triggered."}), 200
+    return jsonify({"message": "Invalid task."}), 400
+
+
+@bp.route("/")
+def home():
+    return "Flask server is running!"
@@ -0,0 +1,46 @@
+# Per-request latency recording and the Prometheus /metrics endpoint.
+from flask import Blueprint, Response, g, jsonify, request
+from utils.metrics import begin_scope, end_scope, render_metrics
+
+bp = Blueprint("metrics", __name__)
+
+
+def _before_request():
+    g.metrics_scope = begin_scope()
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    # Runs for failed requests too, those count as 500
+    scope = g.pop("metrics_scope", None)
+    if scope is None:
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = g.pop("metrics_status", 500)
+    end_scope(
+        scope,
+        "http_request_duration_seconds",
+        {"method": request.method, "route": route, "status": str(status)},
+        f"request {request.method} {route}",
+    )
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(bp)
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+
+    try:
+        body = render_metrics()
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Metrics unavailable: {e}"}), 503
+    return Response(body, mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,72 @@
+# Per-process warmup: open the pools and fill the caches a first request
+# would otherwise pay for. Called by gunicorn's post_worker_init and by the
+# dev server in backend.py.
+import time
+import logging
+from connection.connect_db import get_client, MONGO_COLLECTIONS
+from connection.connect_redis import ping_redis
+from db.redis_operations import get_collection_version
+from utils import session, rate_limit, two_factor
+from utils.hashing import current_rounds
+from web.data import warm_read_api
+from utils.helpers import green, red, reset
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+WEB_REDIS_ROLES = ("default", "cache", "session", "rate_limit")
+
+
+def _mongo():
+    get_client().admin.command("ping")
+
+
+def _redis():
+    if not ping_redis(WEB_REDIS_ROLES):
+        raise ConnectionError("Redis unreachable")
+
+
+def _scripts():
+    for module in (session, rate_limit, two_factor):
+        module.preload_scripts()
+
+
+def _query_versions():
+    # Also starts the L1 invalidation listener when the local cache is on
+    for collection_key in MONGO_COLLECTIONS:
+        get_collection_version(collection_key)
+
+
+WARMUP_STEPS = (
+    ("mongo", _mongo),
+    ("redis", _redis),
+    ("lua_scripts", _scripts),
+    ("query_versions", _query_versions),
+    ("bcrypt_calibration", current_rounds),
+    # Last: needs Mongo, Redis and the query versions above
+    ("read_api_snapshots", warm_read_api),
+)
+
+
+def warm_up():
+
+    # Never raises: a worker that fails to warm up still serves, it just pays
+    # the cost on its first requests. Returns {step: seconds or error}.
+    report = {}
+    started = time.perf_counter()
+    for name, step in WARMUP_STEPS:
+        step_started = time.perf_counter()
+        try:
+            step()
+            report[name] = round(time.perf_counter() - step_started, 4)
+        except Exception as e:
+            logger.error(red + f"Warmup step {name} failed: {e}" + reset)
+            report[name] = str(e)
+    logger.info(
+        green
+        + f"Worker warmed up in {time.perf_counter() - started:.2f}s: {report}"
+        + reset
+    )
+    return report